@@ -1,9 +1,15 @@
 # 1) Enum für die Stati
 from __future__ import annotations
 
+import heapq
 from typing import TYPE_CHECKING
 
+from source.agentic_tasks.agent_run_scheduler import AgentRunScheduler
 from source.agentic_tasks.agents_config import AgentsConfig
+from source.agentic_tasks.pool_events import PoolEventChannel, PoolEventType
+from source.agentic_tasks.ranked_task_index import RankedTaskIndex
+from source.agentic_tasks.task_archive import ArchivedTask, TaskArchive
+from source.agentic_tasks.task_embedding_index import TaskEmbeddingIndex
 from source.agentic_tasks.task_status import TaskStatus
 if TYPE_CHECKING:
 	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
@@ -19,19 +25,33 @@ class AgentPool:
 		self.config: AgentsConfig = config
 		self.agent_tasks: dict[str, AgenticTaskWrapper] = {}
 		self.relevant_agent_tasks: set[str] = set()
+		# the relevant tasks that currently pass is_relevant(), ordered by relevance; kept up to date by on_task_changed
+		self.active_ranking: RankedTaskIndex = RankedTaskIndex()
 		self.active_threshold: float = 0.2  # Minimum relevance to consider a task active
-		self.maximum_messages_to_keep: int = 1000  # Maximum number of messages to keep in the pool
+		self.maximum_messages_to_keep: int = 1000  # Maximum number of tasks in the live pool; the least relevant inactive ones are archived
+		self.archive: TaskArchive = TaskArchive(maximum_size = 10000)
+		self.number_of_evicted_tasks: int = 0
+		self.number_of_archive_hits: int = 0
+		self.task_embedding_index: TaskEmbeddingIndex = TaskEmbeddingIndex()
+		self.number_of_semantic_duplicates: int = 0
+		self.run_scheduler: AgentRunScheduler = AgentRunScheduler(config.agent_run_scheduler)
+		self.number_of_cancelled_runs: int = 0
+		self.estimated_tokens_saved_by_cancellation: int = 0
+		# typed change events (created, rescored, result, deactivated, evicted) for the board, metrics, persistence, ...
+		self.events: PoolEventChannel = PoolEventChannel()
+		# status changes publish no event; counted so the snapshotter notices them
+		self.number_of_status_changes: int = 0
 		
 	def make_all_but_most_relevant_inactive(self):
 		"""
 		Deactivate all but the n most relevant tasks.
 		This is useful to keep the pool manageable and focused on the most relevant tasks.
 		"""
-		active_tasks = self.get_active_agent_tasks(maximum_number = self.config.agent_pool_maximum_messages_to_keep_active,
-		                                           cancel_failed = True)
-		self.relevant_agent_tasks.clear()
-		for task in active_tasks:
-			self.relevant_agent_tasks.add(task.query_or_task)
+		most_relevant = self.active_ranking.top(self.config.agent_pool_maximum_messages_to_keep_active)
+		self.relevant_agent_tasks = set(most_relevant)
+		self.active_ranking.clear()
+		for query_or_task in most_relevant:
+			self._update_ranking(self.agent_tasks[query_or_task])
 		
 	def add_agent_task(self, task: AgenticTaskWrapper):
 		"""
@@ -40,12 +60,85 @@ class AgentPool:
 		"""
 		# debug(f"Adding task {task.query_or_task} to the agent pool.")
 		self.agent_tasks[task.query_or_task] = task
+		self.events.publish(PoolEventType.CREATED, task)
+		if len(self.agent_tasks) > self.maximum_messages_to_keep:
+			self.evict_tasks(keep = task)
+	
+	def _eviction_order(self, task: AgenticTaskWrapper) -> tuple:
+		"""Smaller == evicted first: deactivated/failed, then inactive finished, then pending/running, then active; within that least relevant and oldest first."""
+		if task.status in (TaskStatus.DEACTIVATED, TaskStatus.FAILED):
+			status_rank = 0
+		elif task.query_or_task in self.active_ranking:
+			status_rank = 3
+		elif task.result:
+			status_rank = 1
+		else:
+			status_rank = 2
+		started = task.time_of_execution.timestamp() if task.time_of_execution else 0.0
+		return status_rank, task.get_relevance(), started
+	
+	def evict_tasks(self, keep: AgenticTaskWrapper | None = None) -> int:
+		"""
+		Move tasks from the live pool into the archive until it holds at most 90% of maximum_messages_to_keep,
+		so eviction does not run again on every added task.
+		:return: number of evicted tasks
+		"""
+		target_size = int(self.maximum_messages_to_keep * 0.9)
+		number_to_evict = len(self.agent_tasks) - target_size
+		if number_to_evict <= 0:
+			return 0
+		candidates = (task for task in self.agent_tasks.values() if task is not keep)
+		for task in heapq.nsmallest(number_to_evict, candidates, key = self._eviction_order):
+			self.evict_task(task)
+		debug(f"Evicted {number_to_evict} tasks, {len(self.agent_tasks)} live and {len(self.archive)} archived tasks remain.")
+		return number_to_evict
+	
+	def evict_task(self, task: AgenticTaskWrapper) -> None:
+		self.cancel_running_work(task)
+		del self.agent_tasks[task.query_or_task]
+		self.relevant_agent_tasks.discard(task.query_or_task)
+		self.active_ranking.remove(task.query_or_task)
+		self.number_of_evicted_tasks += 1
+		self.events.publish(PoolEventType.EVICTED, task)
+		for dropped_query_or_task in self.archive.add(ArchivedTask.from_task(task)):
+			self.task_embedding_index.remove(dropped_query_or_task)
+	
+	def take_from_archive(self, query_or_task: str) -> ArchivedTask | None:
+		"""Remove an archived task from the archive (its embedding stays indexed), e.g. to reuse its result."""
+		archived_task = self.archive.take(query_or_task)
+		if archived_task is not None:
+			self.number_of_archive_hits += 1
+		return archived_task
 		
 	def sort_into_relevance(self, task: AgenticTaskWrapper):
 		if task.is_relevant():
 			self.relevant_agent_tasks.add(task.query_or_task)
 		else:
 			self.relevant_agent_tasks.discard(task.query_or_task)
+		self._update_ranking(task)
+	
+	def on_task_changed(self, task: AgenticTaskWrapper, field_name: str):
+		"""
+		Called by the task whenever a field its ranking depends on (relevance, urgency, status, result) changes.
+		"""
+		if self.agent_tasks.get(task.query_or_task) is not task:
+			return
+		if task.status == TaskStatus.FAILED:
+			self.relevant_agent_tasks.discard(task.query_or_task)
+		self._update_ranking(task)
+		if field_name == "status":
+			self.number_of_status_changes += 1
+		elif field_name == "result":
+			if task.result:
+				self.events.publish(PoolEventType.RESULT, task)
+		elif field_name != "status":
+			self.events.publish(PoolEventType.RESCORED, task)
+	
+	def _update_ranking(self, task: AgenticTaskWrapper):
+		if task.query_or_task in self.relevant_agent_tasks and task.is_relevant():
+			self.active_ranking.update(task.query_or_task, task.relevance)
+		else:
+			self.active_ranking.remove(task.query_or_task)
 		
 	def get_already_existing_tasks(self):
 		debug("Getting already existing tasks from the agent pool.")
@@ -53,45 +146,93 @@ class AgentPool:
 	
 	def check_for_duplicate(self, task: AgenticTaskWrapper) -> bool:
 		"""
-		TODO: use vector store
-		:return already_in_pool: bool | AgenticTaskWrapper
+		Exact duplicate check on the query string; see find_semantic_duplicate for near duplicates.
+		:return already_in_pool: bool
 		"""
 		already_in_pool =  self.agent_tasks.get(task.query_or_task, False)
 		if already_in_pool:
 			return not (already_in_pool is task)
 		return False
 	
+	async def find_semantic_duplicate(self, task: AgenticTaskWrapper) -> str | None:
+		"""
+		Look for a known task whose query has (nearly) the same meaning.
+		If there is none, the query is registered in the embedding index right away, so near duplicates
+		created concurrently (e.g. in the same LLM response) are detected as well.
+		Archived tasks stay in the index, so the duplicate may be in self.archive.
+		:return: query_or_task of the duplicate or None
+		"""
+		if task.query_or_task in self.archive:
+			return task.query_or_task
+		index = self.task_embedding_index
+		# embed outside the lock, so concurrent checks do not wait for each other's embedding calls
+		vector = (await index.embed([task.query_or_task]))[0]
+		async with index.lock:
+			if task.query_or_task in index:
+				# the same query was registered while it was embedded
+				return task.query_or_task
+			matches = index.search_vector(vector, k = 1, minimum_similarity = self.config.agent_duplicate_similarity_threshold)
+			for query_or_task, similarity in matches:
+				self.number_of_semantic_duplicates += 1
+				debug(f"Task '{task.query_or_task}' is a near duplicate ({similarity:.2f}) of '{query_or_task}'.")
+				return query_or_task
+			index.add_vector(task.query_or_task, vector)
+			return None
+	
 	def deactivate_failed_tasks(self):
-		for relevant_task in self.relevant_agent_tasks:
+		for relevant_task in list(self.relevant_agent_tasks):
 			task = self.agent_tasks[relevant_task]
-			if task.status is TaskStatus.FAILED:
+			if task.status == TaskStatus.FAILED:
 				self.relevant_agent_tasks.discard(relevant_task)
-				continue
+				self.active_ranking.remove(relevant_task)
 				
 	def deactivate_task(self, task: AgenticTaskWrapper):
 		"""
-		Deactivate a task and remove it from the relevant tasks.
+		Deactivate a task, remove it from the relevant tasks and cancel its queued or running agent run.
 		"""
-		if task.query_or_task in self.relevant_agent_tasks:
-			self.relevant_agent_tasks.discard(task.query_or_task)
-			task.status = TaskStatus.DEACTIVATED
-			debug(f"Task {task.query_or_task} has been deactivated.")
-		else:
-			debug(f"Task {task.query_or_task} was not found in relevant tasks.")
+		self.relevant_agent_tasks.discard(task.query_or_task)
+		self.active_ranking.remove(task.query_or_task)
+		task.status = TaskStatus.DEACTIVATED
+		self.cancel_running_work(task)
+		self.events.publish(PoolEventType.DEACTIVATED, task)
+		debug(f"Task {task.query_or_task} has been deactivated.")
+	
+	def cancel_running_work(self, task: AgenticTaskWrapper) -> int:
+		"""
+		Cancel the unfinished asyncio tasks of a task; the scheduler slots are freed when they unwind.
+		:return: number of cancelled runs
+		"""
+		number_cancelled = task.cancel_running_tasks()
+		if number_cancelled:
+			self.number_of_cancelled_runs += number_cancelled
+			self.estimated_tokens_saved_by_cancellation += number_cancelled * self.config.agent_run_scheduler.estimated_tokens_per_run
+			debug(f"Cancelled {number_cancelled} run(s) of task {task.query_or_task} ({self.number_of_cancelled_runs} cancelled in total).")
+		return number_cancelled
 	
 	def get_active_agent_tasks(self, maximum_number: int = int(10e10), cancel_failed: bool = True) -> list[AgenticTaskWrapper]:
-		if cancel_failed:
-			self.deactivate_failed_tasks()
-		remaining_tasks = []
-		for task_id in self.relevant_agent_tasks:
-			task = self.agent_tasks[task_id]
-			if task.is_relevant():
-				remaining_tasks.append(task)
-		sorted_tasks = sorted(remaining_tasks, key = lambda x: x.relevance, reverse = True)
-		return sorted_tasks[:maximum_number]
+		"""
+		The maximum_number most relevant active tasks, read from active_ranking in O(maximum_number).
+		:param cancel_failed: kept for compatibility; failed tasks leave the ranking as soon as their status changes
+		"""
+		return [self.agent_tasks[query_or_task] for query_or_task in self.active_ranking.top(maximum_number)]
+	
+	def get_rating_candidates(self, maximum_number: int = int(10e10), include_inactive_results: bool = False) -> list[AgenticTaskWrapper]:
+		"""
+		The maximum_number most relevant active tasks plus up to maximum_number tasks of this pool whose runs
+		still wait in the run scheduler: their rating decides the order in which they are admitted.
+		:param include_inactive_results: also every other live task with a result that is neither deactivated nor
+			failed, so a task that once fell below agent_relevance_threshold can become relevant again (sharded rating)
+		"""
+		active_tasks = self.get_active_agent_tasks(maximum_number)
+		candidate_ids = {task.task_id for task in active_tasks}
+		queued_tasks = [task for task in self.run_scheduler.queued_tasks()
+		                if task.agent_pool is self and task.task_id not in candidate_ids and task.status != TaskStatus.DEACTIVATED]
+		candidates = active_tasks + queued_tasks[:maximum_number]
+		if include_inactive_results:
+			candidate_ids.update(task.task_id for task in candidates)
+			candidates += [task for task in self.agent_tasks.values()
+			               if task.result and task.task_id not in candidate_ids and task.status not in (TaskStatus.DEACTIVATED, TaskStatus.FAILED)]
+		return candidates
 	
 	 
 
-
-global_agent_pool_instance = AgentPool()
-
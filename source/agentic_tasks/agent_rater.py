@@ -1,32 +1,46 @@
 import asyncio
+import time
 from typing import Type
 
 from langchain_core.exceptions import OutputParserException
-from langchain_core.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 
-from source.agentic_tasks.agent_pool import AgentPool, global_agent_pool_instance
+from source.agentic_tasks.agent_pool import AgentPool
 from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
 from source.chat.message import Message
 
-from source.agentic_tasks.agent_pool import AgentPool, global_agent_pool_instance
 from source.agentic_tasks.agents_config import AgentsConfig
+from source.agentic_tasks.incremental_rating import RatingLedger
+from source.agentic_tasks.loop_scheduler import LoopScheduler
+from source.agentic_tasks.prompt_templates import ListOfAgentTaskRatings, RATING_PROMPT, RATING_PROMPT_NATIVE, rating_output_parser, render_tasks_with_ids
+from source.agentic_tasks.relevance_prescorer import RelevancePrescorer
+from source.agentic_tasks.sharded_rating import calibrate_shard, split_into_shards
+from source.agentic_tasks.task_status import TaskStatus
 from source.dev_logger import debug
+from source.llm_usage import LlmUsage
+from source.prompt_caching import prepare_cached_prompt
+from source.structured_output import OutputMode, StructuredOutputStatistics, ainvoke_structured
 
 
 class AgentRater:
 	def __init__(self, agent_pool: AgentPool =  None, config: AgentsConfig = AgentsConfig()):
-		self.agent_pool: AgentPool = agent_pool or global_agent_pool_instance
+		self.agent_pool: AgentPool = agent_pool or AgentPool(config = config)
 		self.config: AgentsConfig = config
 		self.latest_unprocessed_message: Message | None = None
 		self.latest_unprocessed_message_event: asyncio.Event = asyncio.Event()
 		self.latest_unprocessed_message_event.clear()
+		self.scheduler: LoopScheduler = LoopScheduler(config = self.config.agent_rating_schedule, name = "agent rating")
+		self.llm_usage: LlmUsage = LlmUsage()
+		self.output_statistics: StructuredOutputStatistics = StructuredOutputStatistics()
+		self.rating_ledger: RatingLedger = RatingLedger(index = self.agent_pool.task_embedding_index, config = self.config.agent_incremental_rating)
+		self.relevance_prescorer: RelevancePrescorer = RelevancePrescorer(index = self.agent_pool.task_embedding_index, config = self.config.agent_relevance_prescoring)
 		
 	def set_latest_unprocessed_message(self, message: Message):
 		"""
 		Set the latest unprocessed message and notify the loop to process it.
 		"""
 		self.latest_unprocessed_message = message
+		self.scheduler.register_update()
 		self.latest_unprocessed_message_event.set()
 		debug(message.content_as_string)
 		
@@ -34,9 +48,15 @@ class AgentRater:
 		while True:
 			await self.latest_unprocessed_message_event.wait()
 			self.latest_unprocessed_message_event.clear()
-
-			debug(f"Creating new agents for message: {self.latest_unprocessed_message.content}")
-			await self.rate_agents(self.latest_unprocessed_message)
+			message = await self.scheduler.wait_until_due(self.latest_unprocessed_message_event, lambda: self.latest_unprocessed_message)
+			if message is None:
+				continue
+			self.scheduler.mark_run(message)
+			candidates = self.agent_pool.get_rating_candidates(include_inactive_results = self.config.agent_sharded_rating.enabled)
+			if not await self.relevance_prescorer.needs_rating(candidates, message):
+				continue
+			debug(f"Rating agents for message: {message.content}")
+			await self.rate_agents(message)
 		
 
 	@classmethod
@@ -44,87 +64,134 @@ class AgentRater:
 		"""
 		Returns the output schema for the rerating function.
 		"""
-		field_info_relevance = AgenticTaskWrapper.model_fields.get("relevance_to_instructions")
-		field_info_urgency = AgenticTaskWrapper.model_fields.get("urgency")
-		assert not (field_info_relevance is None or field_info_urgency is None), "Relevance and urgency fields must be defined in AgentTaskQuery model."
-		class OutputSchemaSingle(BaseModel):
-			task_index: int
-			relevance_to_instructions: float =  Field(default = 0.0,description = getattr(field_info_relevance, "description", "Relevance of the task to the current context."))
-			urgency: float = Field(default = 0.0, description = getattr(field_info_urgency, "description", "Urgency of the task in the current context."))
-		class ListOfAgentTaskQuery(BaseModel):
-			agent_queries: list[OutputSchemaSingle] = Field(
-				default_factory = list,
-				description = "List of agent tasks with their relevance and urgency scores."
-			)
-		return ListOfAgentTaskQuery
+		return ListOfAgentTaskRatings
 	
 	
+	def apply_ratings(self, rated_agents: list[AgenticTaskWrapper], ratings: list) -> None:
+		"""
+		Write the LLM ratings (task_id refers to one of rated_agents) back to the tasks and
+		deactivate the ones below the destruction threshold.
+		"""
+		agents_by_id = {agent.task_id: agent for agent in rated_agents}
+		for rating in ratings:
+			agent = agents_by_id.get(rating.task_id)
+			if agent is None:
+				debug(f"Ignoring rating for unknown task id {rating.task_id}.")
+				continue
+			if agent.status == TaskStatus.DEACTIVATED:
+				continue
+			agent.relevance_to_instructions = rating.relevance_to_instructions
+			agent.urgency = rating.urgency
+			self.rating_ledger.record(agent)
+			if agent.relevance < self.config.agent_destruction_threshold:
+				agent.deactivate()
+		self.agent_pool.run_scheduler.reprioritize()
+	
 	async def rate_agents(self, message: Message,  llm=None) -> list:
 		"""
-		Rerate agents based on their relevance and return a list of active agents.
+		Rerate the active agents and the queued runs whose rating may be outdated (see RatingLedger).
+		With sharded rating enabled all of them are candidates, together with the tasks that have a result but
+		fell below the relevance threshold; otherwise the most relevant ones.
+		"""
+		sharded = self.config.agent_sharded_rating.enabled
+		active_agents = self.agent_pool.get_rating_candidates(
+			maximum_number=int(10e10) if sharded else self.config.agents_number_shown_to_rater,
+			include_inactive_results=sharded,
+		)
+		agents_to_rate = await self.rating_ledger.select_tasks_to_rate(active_agents, message)
+		if agents_to_rate:
+			if sharded and len(agents_to_rate) > self.config.agent_sharded_rating.shard_size:
+				await self._rate_sharded(agents_to_rate, message = message, llm = llm)
+			else:
+				self.apply_ratings(agents_to_rate, await self._request_ratings(agents_to_rate, message = message, llm = llm))
+		# only now: if the rating failed, the messages still count as new and the selected tasks stay due
+		self.rating_ledger.complete_version(message)
+	
+	async def _rate_sharded(self, agents_to_rate: list[AgenticTaskWrapper], message: Message, llm=None) -> None:
+		"""
+		Rates the shards concurrently (at most maximum_parallel_shards at a time) within latency_budget_sec
+		and calibrates every shard against the reference shard through the shared anchor tasks.
 		"""
+		config = self.config.agent_sharded_rating
+		anchors, shards = split_into_shards(agents_to_rate, config)
+		semaphore = asyncio.Semaphore(config.maximum_parallel_shards)
 		
-		# create the schema for the lmm parsing
-		field_info_relevance = AgenticTaskWrapper.model_fields.get("relevance_to_instructions")
-		field_info_urgency = AgenticTaskWrapper.model_fields.get("urgency")
-		assert not (field_info_relevance is None or field_info_urgency is None), "Relevance and urgency fields must be defined in AgentTaskQuery model."
-		class OutputSchemaSingle(BaseModel):
-			task_index: int
-			relevance_to_instructions: float =  Field(default = 0.0,description = getattr(field_info_relevance, "description", "Relevance of the task to the current context."))
-			urgency: float = Field(default = 0.0, description = getattr(field_info_urgency, "description", "Urgency of the task in the current context."))
-		class ListOfAgentTasks(BaseModel):
-			agent_queries: list[OutputSchemaSingle] = Field(
-				default_factory = list,
-				description = "List of agent tasks with their relevance and urgency scores."
-			)
-		parser = PydanticOutputParser(pydantic_object = ListOfAgentTasks)
+		async def rate_shard(shard: list[AgenticTaskWrapper]) -> list:
+			async with semaphore:
+				return await self._request_ratings(shard, message = message, llm = llm)
 		
-		#--------
+		start = time.perf_counter()
+		shard_tasks = [asyncio.create_task(rate_shard(shard)) for shard in shards]
+		done, pending = await asyncio.wait(shard_tasks, timeout = config.latency_budget_sec)
+		for shard_task in pending:
+			shard_task.cancel()
+		
+		def ratings_of(shard_task: asyncio.Task) -> list | None:
+			if shard_task not in done or shard_task.cancelled():
+				return None
+			if shard_task.exception() is not None:
+				debug(f"Rating shard failed: {shard_task.exception()}")
+				return None
+			return shard_task.result()
+		
+		anchor_ids = {anchor.task_id for anchor in anchors}
+		reference_ratings = ratings_of(shard_tasks[0])
+		if reference_ratings is not None:
+			reference = {rating.task_id: (rating.relevance_to_instructions, rating.urgency) for rating in reference_ratings if rating.task_id in anchor_ids}
+			merged_ratings = list(reference_ratings)
+		else:
+			# without the reference shard the anchors' ratings from before this run are the reference
+			reference = {anchor.task_id: (anchor.relevance_to_instructions, anchor.urgency) for anchor in anchors}
+			merged_ratings = []
+		for shard_task in shard_tasks[1:]:
+			shard_ratings = ratings_of(shard_task)
+			if shard_ratings is not None:
+				merged_ratings += calibrate_shard(shard_ratings, anchor_ids = anchor_ids, reference = reference)
+		
+		number_of_rated_shards = sum(ratings_of(shard_task) is not None for shard_task in shard_tasks)
+		debug(f"Rated {number_of_rated_shards} of {len(shards)} shards ({len(agents_to_rate)} tasks) in {time.perf_counter() - start:.2f} sec.")
+		self.apply_ratings(agents_to_rate, merged_ratings)
+	
+	async def _request_ratings(self, agents_to_rate: list[AgenticTaskWrapper], message: Message, llm=None) -> list:
 		llm = llm or self.config.get_agent_rating_llm()
-		active_agents = self.agent_pool.get_active_agent_tasks(
-			maximum_number=self.config.agents_number_shown_to_rater,
-			cancel_failed=True
+		native = self.config.agent_rating_output_mode == OutputMode.native
+		prompt = (RATING_PROMPT_NATIVE if native else RATING_PROMPT).render(
+			tasks = render_tasks_with_ids(agents_to_rate),
+			assistant_instructions = self.config.assistant_instructions,
+			chat = message.get_chat_context( config = self.config.summarization_config, minimum_number_of_messages = self.config.minimum_number_of_unchanged_messages),
 		)
-		prompt = ""
-		prompt += (f"you now are supposed to rate how relevant the following tasks are to the current conext instructions:\n")
-		prompt += (f"<tasks>\n")
-		prompt += (f"{[(str(index)+ ": " + task.query_or_task) for index, task in enumerate(active_agents)] if active_agents else []}\n")
-		prompt += (f"</tasks>\n")
-		
-		prompt += (f"<assistance_instructions>{self.config.assistant_instructions}</assistance_instructions> (be aware that,"
-		           f" when the instructions tell you, e.g. provide 3 actionable steps, that means all steps more than 3 will have 0 urgency.\n")
-		prompt += (f"Here is the chat you need for rating:\n<chat>{message.get_chat_context( config = self.config.summarization_config, minimum_number_of_messages = self.config.minimum_number_of_unchanged_messages)}</chat>\n")
-
 		
-		prompt += (f" you now are supposed to give me a list of of python object representing relevance and urgency.\n")
-		prompt += (f"the output should be in the following form:\n")
-		prompt += (f"<json>\n")
-		prompt += (f"RESULT\n")
-		prompt += (f"</json>\n"
-		           f"RESULT shale have the following structure:\n"
-		           f"{parser.get_format_instructions()}\n")
-		prompt += (f"you may think first (only very shortly because of latency). Put your thinking into <thinking>...</thinking> tag. the result in <json>...</json> tag.\n")
+		start = time.perf_counter()
+		if native:
+			parsed, result, parsing_error = await ainvoke_structured(llm, prompt, ListOfAgentTaskRatings)
+			self.llm_usage.record(result, time.perf_counter() - start)
+			self.output_statistics.record(OutputMode.native, parsed = parsing_error is None)
+			if parsing_error is None:
+				return parsed.agent_queries
+			debug(f"Error while parsing native structured agent ratings: {parsing_error}")
+			if llm is not self.config.get_agent_rating_llm():
+				return await self._request_ratings(agents_to_rate, message=message,  llm=self.config.get_agent_rating_llm())
+			raise parsing_error
 		
-		result = await llm.ainvoke(prompt)
+		text, invoke_kwargs = await prepare_cached_prompt(llm, prompt, RATING_PROMPT.static_prefix, self.config.prompt_caching)
+		result = await llm.ainvoke(text, **invoke_kwargs)
+		self.llm_usage.record(result, time.perf_counter() - start)
 		if isinstance(result.content, list):
 			parsing_content = result.content[ - 1].split("<json>")[-1].split("</json>")[0].strip()
 		else:
 			parsing_content = result.content.split("<json>")[-1].split("</json>")[0].strip()
 		try:
-			parsed_results = parser.parse(parsing_content).agent_queries
-			for task in parsed_results:
-				agent = active_agents[task.task_index]
-				agent.relevance_to_instructions = task.relevance_to_instructions
-				agent.urgency = task.urgency
-				if agent.relevance < self.config.agent_destruction_threshold:
-					agent.deactivate()
+			parsed_results = rating_output_parser.parse(parsing_content).agent_queries
+			self.output_statistics.record(OutputMode.tagged_json, parsed = True)
+			return parsed_results
 				
 		except OutputParserException as e:
+			self.output_statistics.record(OutputMode.tagged_json, parsed = False)
 			debug(f"Error while parsing agent tasks: {parsing_content}")
 			debug(f"Prompt: {prompt}")
 			debug(f"Error: {e}")
 			if llm is not self.config.get_agent_rating_llm():
-				return await self.rate_agents(message=message,  llm=self.config.get_agent_rating_llm())
+				return await self._request_ratings(agents_to_rate, message=message,  llm=self.config.get_agent_rating_llm())
 			else:
 				raise e
 			
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator
+
+from pydantic import BaseModel, Field
+
+from source.dev_logger import debug
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+
+
+class AgentRunSchedulerConfig(BaseModel):
+	maximum_concurrent_runs: int = Field(default = 4, description = "Agent runs executing at the same time, over all models.")
+	maximum_concurrent_runs_per_model: dict[str, int] = Field(default_factory = dict, description = "Per model override of default_maximum_concurrent_runs_per_model.")
+	default_maximum_concurrent_runs_per_model: int = 3
+	tokens_per_minute_per_model: dict[str, int] = Field(default_factory = dict, description = "Token budget per model and minute; models without entry are not limited.")
+	estimated_tokens_per_run: int = Field(default = 4000, description = "Tokens charged against the budget for every admitted run.")
+
+
+class _WaitingRun:
+	def __init__(self, task: AgenticTaskWrapper, model_name: str, tokens: int):
+		self.task: AgenticTaskWrapper = task
+		self.model_name: str = model_name
+		self.tokens: int = tokens
+		self.admitted: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+		self.sequence: int = 0
+
+
+class AgentRunScheduler:
+	"""
+	Admits agent runs by priority (AgenticTaskWrapper.get_relevance(), evaluated when a slot frees up,
+	so rescoring by the rater reorders the queue) under a global and per model concurrency cap and
+	an optional per model tokens-per-minute budget.
+
+	Usage:
+		async with scheduler.slot(task, model_name):
+			await agent.run(task)
+	"""
+
+	def __init__(self, config: AgentRunSchedulerConfig = None):
+		self.config: AgentRunSchedulerConfig = config or AgentRunSchedulerConfig()
+		self._waiting: list[_WaitingRun] = []
+		self._running_per_model: dict[str, int] = {}
+		self._tokens_per_model: dict[str, deque[tuple[float, int]]] = {}
+		self._sequence: int = 0
+		self._refill_handle: asyncio.TimerHandle | None = None
+		self.number_of_admitted_runs: int = 0
+
+	@property
+	def number_of_running(self) -> int:
+		return sum(self._running_per_model.values())
+
+	@property
+	def number_of_waiting(self) -> int:
+		return len(self._waiting)
+
+	def _model_cap(self, model_name: str) -> int:
+		return self.config.maximum_concurrent_runs_per_model.get(model_name, self.config.default_maximum_concurrent_runs_per_model)
+
+	def _tokens_used_last_minute(self, model_name: str, now: float) -> int:
+		used = self._tokens_per_model.setdefault(model_name, deque())
+		while used and now - used[0][0] >= 60.0:
+			used.popleft()
+		return sum(tokens for _, tokens in used)
+
+	def _seconds_until_tokens_free(self, model_name: str, now: float) -> float:
+		used = self._tokens_per_model.get(model_name)
+		return max(0.0, 60.0 - (now - used[0][0])) if used else 0.0
+
+	def _dispatch(self) -> None:
+		now = time.monotonic()
+		refill_in: float | None = None
+		# runs cancelled while queued (deactivation, eviction, session close) leave their waiter behind until
+		# their coroutine unwinds; they must neither be counted nor admitted
+		self._waiting = [waiting for waiting in self._waiting if not waiting.admitted.done()]
+		# priority is read now, not at enqueue time: the rater may have rescored the tasks meanwhile
+		for waiting in sorted(self._waiting, key = lambda w: (-w.task.get_relevance(), w.sequence)):
+			if self.number_of_running >= self.config.maximum_concurrent_runs:
+				break
+			if self._running_per_model.get(waiting.model_name, 0) >= self._model_cap(waiting.model_name):
+				continue
+			budget = self.config.tokens_per_minute_per_model.get(waiting.model_name)
+			if budget is not None and self._tokens_per_model.get(waiting.model_name) and \
+					self._tokens_used_last_minute(waiting.model_name, now) + waiting.tokens > budget:
+				wait = self._seconds_until_tokens_free(waiting.model_name, now)
+				refill_in = wait if refill_in is None else min(refill_in, wait)
+				continue
+			self._waiting.remove(waiting)
+			self._running_per_model[waiting.model_name] = self._running_per_model.get(waiting.model_name, 0) + 1
+			self._tokens_per_model.setdefault(waiting.model_name, deque()).append((now, waiting.tokens))
+			self.number_of_admitted_runs += 1
+			waiting.admitted.set_result(None)
+		if refill_in is not None and self._refill_handle is None:
+			self._refill_handle = asyncio.get_running_loop().call_later(refill_in + 0.01, self._on_refill)
+
+	def _on_refill(self) -> None:
+		self._refill_handle = None
+		self._dispatch()
+
+	def queued_tasks(self) -> list[AgenticTaskWrapper]:
+		"""Tasks whose runs wait for admission, in queue order."""
+		return [waiting.task for waiting in self._waiting if not waiting.admitted.done()]
+
+	def reprioritize(self) -> None:
+		"""Call after relevance/urgency of tasks changed, so queued runs are admitted in the new order."""
+		if self._waiting:
+			self._dispatch()
+
+	def _release(self, model_name: str) -> None:
+		self._running_per_model[model_name] -= 1
+		self._dispatch()
+
+	@asynccontextmanager
+	async def slot(self, task: AgenticTaskWrapper, model_name: str, estimated_tokens: int | None = None) -> AsyncIterator[None]:
+		waiting = _WaitingRun(task = task, model_name = model_name, tokens = estimated_tokens or self.config.estimated_tokens_per_run)
+		self._sequence += 1
+		waiting.sequence = self._sequence
+		self._waiting.append(waiting)
+		self._dispatch()
+		if not waiting.admitted.done():
+			debug(f"Queued agent run for '{task.query_or_task}' ({self.number_of_waiting} waiting, {self.number_of_running} running).")
+		try:
+			await waiting.admitted
+		except asyncio.CancelledError:
+			if waiting in self._waiting:
+				self._waiting.remove(waiting)
+			elif waiting.admitted.done() and not waiting.admitted.cancelled():
+				self._release(model_name)
+			raise
+		try:
+			yield
+		finally:
+			self._release(model_name)
+
+	def statistics(self) -> dict[str, int]:
+		return {
+			"running": self.number_of_running,
+			"waiting": self.number_of_waiting,
+			"admitted": self.number_of_admitted_runs,
+		}
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+from source.agentic_tasks.agent_pool import AgentPool
+from source.agentic_tasks.agent_rater import AgentRater
+from source.agentic_tasks.agent_run_scheduler import AgentRunScheduler
+from source.agentic_tasks.agentic_tasks_factory import AgenticTasksFactory
+from source.agentic_tasks.agents_config import AgentsConfig
+from source.agentic_tasks.fused_create_and_rate import FusedAgentCreatorAndRater
+from source.agentic_tasks.pool_snapshot import PoolSnapshotter
+from source.chat.message import Message
+from source.chat.topic_segmenter import TopicSegmenter
+from source.dev_logger import debug
+
+
+class AgentSession:
+	"""
+	Everything the agents of one conversation need: its config, pool, factory, rater (or fused creator
+	and rater) and snapshotter. Sessions share nothing but the embedding model and the run scheduler.
+	"""
+
+	def __init__(self, conversation_id: str, config: AgentsConfig, run_scheduler: AgentRunScheduler | None = None):
+		self.conversation_id: str = conversation_id
+		self.config: AgentsConfig = config
+		self.agent_pool: AgentPool = AgentPool(config = config)
+		if run_scheduler is not None:
+			self.agent_pool.run_scheduler = run_scheduler
+		self.agent_tasks_factory: AgenticTasksFactory = AgenticTasksFactory(agent_pool = self.agent_pool, config = config)
+		self.agent_rater: AgentRater = AgentRater(agent_pool = self.agent_pool, config = config)
+		self.agent_creator_and_rater: FusedAgentCreatorAndRater = FusedAgentCreatorAndRater(
+			agent_tasks_factory = self.agent_tasks_factory, agent_rater = self.agent_rater, config = config)
+		self.pool_snapshotter: PoolSnapshotter = PoolSnapshotter(
+			agent_tasks_factory = self.agent_tasks_factory, get_latest_message = self.get_latest_message, config = config.agent_pool_snapshot)
+		self.background_tasks: list[asyncio.Task] = []
+		self.created_at: float = time.time()
+
+	def get_latest_message(self) -> Message | None:
+		return self.agent_tasks_factory.latest_unprocessed_message or self.agent_creator_and_rater.latest_unprocessed_message
+
+	def set_latest_unprocessed_message(self, message: Message) -> None:
+		if self.config.fused_create_and_rate:
+			self.agent_creator_and_rater.set_latest_unprocessed_message(message)
+		else:
+			self.agent_tasks_factory.set_latest_unprocessed_message(message)
+			self.agent_rater.set_latest_unprocessed_message(message)
+
+	async def start(self) -> Message | None:
+		"""
+		Start the creation and rating loops; restore the last snapshot and start snapshotting if enabled.
+		:return: the most recent restored message, or None if nothing was restored
+		"""
+		if self.config.fused_create_and_rate:
+			self.background_tasks.append(asyncio.create_task(self.agent_creator_and_rater.run_in_loop()))
+		else:
+			self.background_tasks.append(asyncio.create_task(self.agent_tasks_factory.run_in_loop()))
+			self.background_tasks.append(asyncio.create_task(self.agent_rater.run_in_loop()))
+		restored_message = None
+		if self.config.agent_pool_snapshot.enabled:
+			restored_message = await self.pool_snapshotter.restore()
+			self.background_tasks.append(asyncio.create_task(self.pool_snapshotter.run_in_loop()))
+		return restored_message
+
+	async def close(self) -> None:
+		"""Stop the loops, cancel all agent runs and drop the conversation's cached topic segments."""
+		for background_task in self.background_tasks:
+			background_task.cancel()
+		await asyncio.gather(*self.background_tasks, return_exceptions = True)
+		self.background_tasks.clear()
+		for task in list(self.agent_pool.agent_tasks.values()):
+			self.agent_pool.cancel_running_work(task)
+		TopicSegmenter.forget_conversation(self.conversation_id)
+
+	def resource_usage(self) -> dict[str, Any]:
+		agent_pool = self.agent_pool
+		return {
+			"live_tasks": len(agent_pool.agent_tasks),
+			"active_tasks": len(agent_pool.active_ranking),
+			"archived_tasks": len(agent_pool.archive),
+			"embedded_tasks": len(agent_pool.task_embedding_index),
+			"running_agent_runs": sum(len(task.running_tasks) for task in agent_pool.agent_tasks.values()),
+			"cancelled_agent_runs": agent_pool.number_of_cancelled_runs,
+			"pool_events": agent_pool.events.number_of_events,
+			"snapshots": self.pool_snapshotter.number_of_snapshots,
+			"creation_llm": self.agent_tasks_factory.llm_usage.as_dict(),
+			"rating_llm": self.agent_rater.llm_usage.as_dict(),
+			"fused_llm": self.agent_creator_and_rater.llm_usage.as_dict(),
+			"agent_llm": self.agent_tasks_factory.agent.llm_usage.as_dict(),
+			"agent_output": self.agent_tasks_factory.agent.output_statistics.as_dict(),
+			"agent_hedging": self.agent_tasks_factory.agent.hedging_statistics.as_dict(),
+			"uptime_sec": round(time.time() - self.created_at, 1),
+		}
+
+
+class SessionRegistry:
+	"""
+	The AgentSessions of all conversations served by this process, by conversation_id.
+	Sessions created without an explicit config get their own copy of base_config, so changing the
+	instructions of one meeting does not change the others.
+	"""
+
+	def __init__(self, base_config: AgentsConfig):
+		self.base_config: AgentsConfig = base_config
+		# provider rate limits hold for the whole process, not per meeting
+		self.run_scheduler: AgentRunScheduler = AgentRunScheduler(base_config.agent_run_scheduler)
+		self.sessions: dict[str, AgentSession] = {}
+
+	def __len__(self) -> int:
+		return len(self.sessions)
+
+	def __contains__(self, conversation_id: str) -> bool:
+		return conversation_id in self.sessions
+
+	def get(self, conversation_id: str) -> AgentSession | None:
+		return self.sessions.get(conversation_id)
+
+	def get_or_create(self, conversation_id: str, config: AgentsConfig | None = None) -> AgentSession:
+		session = self.sessions.get(conversation_id)
+		if session is not None:
+			return session
+		if config is None:
+			config = self.base_config.model_copy(deep = True)
+			snapshot_path = config.agent_pool_snapshot.path
+			config.agent_pool_snapshot.path = snapshot_path.with_name(f"{snapshot_path.stem}_{conversation_id}{snapshot_path.suffix}")
+		session = AgentSession(conversation_id, config = config, run_scheduler = self.run_scheduler)
+		self.sessions[conversation_id] = session
+		debug(f"Created agent session '{conversation_id}' ({len(self.sessions)} sessions).")
+		return session
+
+	async def close(self, conversation_id: str) -> None:
+		session = self.sessions.pop(conversation_id, None)
+		if session is None:
+			return
+		await session.close()
+		debug(f"Closed agent session '{conversation_id}' ({len(self.sessions)} sessions left).")
+
+	async def close_all(self) -> None:
+		for conversation_id in list(self.sessions):
+			await self.close(conversation_id)
+
+	def resource_usage(self) -> dict[str, dict[str, Any]]:
+		return {conversation_id: session.resource_usage() for conversation_id, session in self.sessions.items()}
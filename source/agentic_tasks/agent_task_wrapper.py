@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import asyncio
 import datetime
+import uuid
 from typing import Callable, Any, List, Literal, TYPE_CHECKING
 
 from langchain_core.output_parsers import PydanticOutputParser
@@ -13,11 +14,14 @@ from source.agentic_tasks.agent_pool import AgentPool
 from source.agentic_tasks.task_status import TaskStatus
 from source.chat.message import Message
 from source.dev_logger import debug
+from source.global_models import get_model_name
 from source.markdown_to_braufiful_html import convert_markdown_to_beautiful_html
 
 if TYPE_CHECKING:
 	from source.agents.default_search_agent import DefaultAgent
 
+_RANKING_FIELDS = frozenset({"relevance_to_instructions", "urgency", "forced_relevance", "status", "result"})
+
 AllowedTypesOfAnswers = Literal["info", "suggestion", "warning", "error", "other"]
 
 class AgentTaskResult(BaseModel):
@@ -113,6 +117,8 @@ print(generate_id("user"))
 
 
 class AgenticTaskWrapper(BaseModel):
+	task_id: SkipJsonSchema[str] = Field(default_factory = lambda: uuid.uuid4().hex[:8],
+	                                     description = "Stable short id of the task; the rater references tasks by it.")
 	query_or_task: str
 	category: str
 	relevance_to_instructions: float = Field(default = 0.0, le = 1.0, ge = -1.0,
@@ -144,9 +150,27 @@ class AgenticTaskWrapper(BaseModel):
 	
 	model_config = ConfigDict(use_enum_values = True, arbitrary_types_allowed = True, )
 	
+	def __setattr__(self, name: str, value: Any) -> None:
+		if name not in _RANKING_FIELDS or self.agent_pool is None:
+			super().__setattr__(name, value)
+			return
+		old_value = getattr(self, name)
+		super().__setattr__(name, value)
+		# keep the pool's ranking of active tasks up to date and let it publish the change
+		if getattr(self, name) != old_value:
+			self.agent_pool.on_task_changed(self, name)
+	
 	def deactivate (self) -> None:
 		self.agent_pool.deactivate_task(self)
 	
+	def cancel_running_tasks(self) -> int:
+		number_cancelled = 0
+		for running_task in self.running_tasks:
+			if not running_task.done():
+				running_task.cancel()
+				number_cancelled += 1
+		return number_cancelled
+	
 	async def finalize_task(
 			self,
 			message: Message,
@@ -168,12 +192,12 @@ class AgenticTaskWrapper(BaseModel):
 			# async def run_function(thing):
 			# 	debug(f"Running task for {thing.query_or_task}")
 			# task = asyncio.create_task(run_function(self))
-			task = asyncio.create_task(agent.run(self))
-			# Setze den Status direkt auf RUNNING
-			self.status = TaskStatus.RUNNING
+			task = asyncio.create_task(self._run_when_admitted(agent))
 			
 			if self.callback_result_update:
 				def _on_done(t: asyncio.Task[Any]):
+					if t.cancelled():
+						return
 					try:
 						result = t.result()
 						asyncio.create_task(self.callback_result_update(result))
@@ -189,11 +213,23 @@ class AgenticTaskWrapper(BaseModel):
 		if start_running:
 			self.run_task_non_blocking()
 	
+	async def _run_when_admitted(self, agent: DefaultAgent) -> AgentTaskResult:
+		# the task stays PENDING until the pool's scheduler admits it
+		async with self.agent_pool.run_scheduler.slot(self, model_name = get_model_name(agent.category_query_llm)):
+			self.status = TaskStatus.RUNNING
+			return await agent.run(self)
+	
 	def run_task_non_blocking(self) -> None:
 		assert self.task_factory is not None, "task_factory muss gesetzt sein"
 		self.time_of_execution = datetime.datetime.now()
 		task = self.task_factory()
 		self.running_tasks.append(task)
+		# only unfinished runs are kept, finished asyncio tasks would pile up on long-lived tasks
+		task.add_done_callback(self._forget_finished_run)
+	
+	def _forget_finished_run(self, task: asyncio.Task[Any]) -> None:
+		if task in self.running_tasks:
+			self.running_tasks.remove(task)
 	
 	@property
 	def relevance(self):
@@ -214,6 +250,9 @@ class AgenticTaskWrapper(BaseModel):
 		return self.relevance_to_instructions*self.urgency
 	
 	async def set_result(self, result: AgentTaskResult):
+		if self.status == TaskStatus.DEACTIVATED:
+			debug(f"Ignoring result of deactivated task {self.query_or_task}.")
+			return
 		self.result = result
 		self.agent_pool.sort_into_relevance(self)
 		if self.callback_result_update is not None:
@@ -2,66 +2,103 @@
 from __future__ import annotations
 
 import asyncio
+import time
 
 from langchain_core.exceptions import OutputParserException
 from langchain_openai import ChatOpenAI
+from pydantic import ValidationError
 
-from source.agentic_tasks.agent_pool import AgentPool, global_agent_pool_instance
-from source.agentic_tasks.agent_task_wrapper import ListOfAgenticTaskWrappers, AgenticTaskWrapper
+from source.agentic_tasks.agent_pool import AgentPool
+from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper, ListOfAgenticTaskWrappers
 from source.agentic_tasks.agents_config import AgentsConfig
+from source.agentic_tasks.incremental_json_parser import IncrementalJsonArrayParser
+from source.agentic_tasks.loop_scheduler import LoopScheduler
+from source.agentic_tasks.prompt_templates import CREATION_PROMPT, CREATION_PROMPT_NATIVE, task_list_output_parser
 from source.agents.default_search_agent import DefaultAgent
 from source.chat.message import Message
 from source.dev_logger import debug
 from source.global_models import default_thinking_model
-from source.web_app.core.summary_board import summary_board
+from source.llm_usage import LlmUsage
+from source.prompt_caching import prepare_cached_prompt
+from source.structured_output import OutputMode, StructuredOutputStatistics, ainvoke_structured
 
 
 class AgenticTasksFactory:
 	def __init__(self,agent_pool: AgentPool =  None,  config: AgentsConfig = AgentsConfig()):
-		self.agent_pool: AgentPool = agent_pool or  global_agent_pool_instance
+		self.agent_pool: AgentPool = agent_pool or AgentPool(config = config)
 		self.config: AgentsConfig = config
 		self.latest_unprocessed_message: Message | None = None
 		self.latest_unprocessed_message_event: asyncio.Event = asyncio.Event()
+		self.scheduler: LoopScheduler = LoopScheduler(config = self.config.agent_creation_schedule, name = "agent creation")
+		self.llm_usage: LlmUsage = LlmUsage()
+		self.output_statistics: StructuredOutputStatistics = StructuredOutputStatistics()
+		# stateless between runs, so all tasks of this factory share one agent
+		self.agent: DefaultAgent = DefaultAgent(config = self.config)
 		
 	def set_latest_unprocessed_message(self, message: Message):
 		self.latest_unprocessed_message = message
+		self.scheduler.register_update()
 		self.latest_unprocessed_message_event.set()
 		
 	async def run_in_loop(self):
 		while True:
 			await self.latest_unprocessed_message_event.wait()
 			self.latest_unprocessed_message_event.clear()
-			debug(f"Creating new agents for message: {self.latest_unprocessed_message.content}")
-			await self.create_new_agents(self.latest_unprocessed_message)
+			message = await self.scheduler.wait_until_due(self.latest_unprocessed_message_event, lambda: self.latest_unprocessed_message)
+			if message is None:
+				continue
+			self.scheduler.mark_run(message)
+			debug(f"Creating new agents for message: {message.content}")
+			await self.create_new_agents(message)
 
 	
+	async def get_tasks_not_to_create(self, message: Message) -> list[str]:
+		"""
+		The existing tasks most similar to the recent chat, at most agents_number_shown_to_creater of them,
+		so the creation prompt does not grow with the number of tasks created during a meeting.
+		"""
+		index = self.agent_pool.task_embedding_index
+		maximum_number = self.config.agents_number_shown_to_creater
+		if len(index) <= maximum_number:
+			return index.keys()
+		chat_window = message.get_recent_chat_window(self.config.minimum_number_of_unchanged_messages)
+		return [query_or_task for query_or_task, _ in await index.search(chat_window, k = maximum_number, transient = True)]
+	
+	async def _build_creation_prompt(self, message: Message) -> str:
+		tasks_not_to_create = await self.get_tasks_not_to_create(message)
+		debug(self.config.assistant_instructions)
+		native = self.config.agent_creation_output_mode == OutputMode.native
+		return (CREATION_PROMPT_NATIVE if native else CREATION_PROMPT).render(
+			assistant_instructions = self.config.assistant_instructions,
+			chat = message.get_chat_context( config = self.config.summarization_config, minimum_number_of_messages = self.config.minimum_number_of_unchanged_messages),
+			tasks_not_to_create = tasks_not_to_create,
+		)
+	
 	async def create_new_agents(self, message: Message, llm: ChatOpenAI = None):
 		llm = llm or self.config.get_agent_creation_llm()
-		already_existing_tasks = self.agent_pool.get_already_existing_tasks()
-		debug(self.config.assistant_instructions)
-		prompt = ""
-		prompt += (f"you create agent tasks according to the assistance_instructions taking_into_account_the_context_and_the_chat.\n")
-		prompt += (f"<assistance_instructions>{self.config.assistant_instructions}</assistance_instructions>\n")
-		prompt += (f"<chat>{message.get_chat_context( config = self.config.summarization_config, minimum_number_of_messages = self.config.minimum_number_of_unchanged_messages)}</chat>\n")
-		prompt += (f"previously you already have created such tasks. you shall not create duplicates or near duplicates of those tasks. the ones you already have created are:\n")
-		prompt += (f"<tasks_not_to_create>{[task.query_or_task for task in already_existing_tasks] if already_existing_tasks else []}</tasks_not_to_create>\n")
-		prompt += (f"if you deem it appropriate. you now can create a new task in case you think thumbsting similar does not already exist.\n")
-		prompt += (f"your output shall be put into <json> tags in the following form:\n")
-		prompt += (f"<json>ResultHere</json>\n")
-		prompt += f"ResultHere shall suffice {ListOfAgenticTaskWrappers.get_pydantic_output_parser().get_format_instructions()}\n"
-		prompt += (f"")
+		prompt = await self._build_creation_prompt(message)
+		if self.config.agent_creation_output_mode == OutputMode.native:
+			return await self._create_new_agents_native(message = message, prompt = prompt, llm = llm)
+		if self.config.stream_agent_creation:
+			return await self._create_new_agents_streaming(message = message, prompt = prompt, llm = llm)
 		
-		result = await llm.ainvoke(prompt)
-		json_string = result.content.split("<json>")[-1].split("</json>")[0].strip()
+		start = time.perf_counter()
+		text, invoke_kwargs = await prepare_cached_prompt(llm, prompt, CREATION_PROMPT.static_prefix, self.config.prompt_caching)
+		result = await llm.ainvoke(text, **invoke_kwargs)
+		self.llm_usage.record(result, time.perf_counter() - start)
+		return await self._parse_and_finalize_tasks(result.content, message = message, prompt = prompt, llm = llm)
+	
+	async def _parse_and_finalize_tasks(self, content: str, message: Message, prompt: str, llm: ChatOpenAI):
+		json_string = content.split("<json>")[-1].split("</json>")[0].strip()
 		if not json_string:
+			self.output_statistics.record(OutputMode.tagged_json, parsed = True)
 			return []
 		try:
-			agent_tasks = ListOfAgenticTaskWrappers.get_pydantic_output_parser().parse(json_string).list_of_tasks
-			final_tasks = []
-			for task in agent_tasks:
-				final_tasks.append(self.finalize_task_non_blocking(task, message = message))
-			return final_tasks
+			agent_tasks = task_list_output_parser.parse(json_string).list_of_tasks
+			self.output_statistics.record(OutputMode.tagged_json, parsed = True)
+			return await self.gather_finalized_tasks([self.finalize_task_non_blocking(task, message = message) for task in agent_tasks])
 		except OutputParserException as e:
+			self.output_statistics.record(OutputMode.tagged_json, parsed = False)
 			debug(f"Error while parsing agent tasks: {json_string}")
 			debug(f"Prompt: {prompt}")
 			debug(f"Error: {e}")
@@ -69,22 +106,90 @@ class AgenticTasksFactory:
 				return await self.create_new_agents(message = message, llm = default_thinking_model)
 			else:
 				raise e
-			 
-	def finalize_task_non_blocking(self, task: AgenticTaskWrapper, message: Message) -> AgenticTaskWrapper:
-		already_in_pool = self.agent_pool.check_for_duplicate(task)
-		if already_in_pool:
-			return task
-		asyncio.create_task( task.finalize_task(agent_pool = self.agent_pool,
-		                                       message = message,
-		                         callback_result_update = lambda : summary_board.inform_change(agent_pool = self.agent_pool, task = task),
-		                         start_running = True,
-		                         agent = DefaultAgent()) )
-		
-		
-		
-		
-		
-		
-		
+	
+	async def _create_new_agents_native(self, message: Message, prompt: str, llm: ChatOpenAI):
+		"""
+		OutputMode.native: the provider returns the task list as schema conform JSON, so there is no tag
+		extraction and far fewer re-issued calls. The answer arrives as a whole, i.e. tasks are not streamed.
+		"""
+		start = time.perf_counter()
+		parsed, result, parsing_error = await ainvoke_structured(llm, prompt, ListOfAgenticTaskWrappers)
+		self.llm_usage.record(result, time.perf_counter() - start)
+		self.output_statistics.record(OutputMode.native, parsed = parsing_error is None)
+		if parsing_error is not None:
+			debug(f"Error while parsing native structured agent tasks: {parsing_error}")
+			if llm is not default_thinking_model:
+				return await self.create_new_agents(message = message, llm = default_thinking_model)
+			raise parsing_error
+		return await self.gather_finalized_tasks([self.finalize_task_non_blocking(task, message = message) for task in parsed.list_of_tasks])
+	
+	async def _create_new_agents_streaming(self, message: Message, prompt: str, llm: ChatOpenAI):
+		"""
+		Streams the creation call and finalizes (== starts) every task as soon as its JSON object is complete,
+		so the first agents run while the LLM is still writing the rest of the list.
+		"""
+		start = time.perf_counter()
+		parser = IncrementalJsonArrayParser(start_marker = "<json>")
+		content = ""
+		aggregated_chunks = None
+		decisions = []
+		number_of_invalid_tasks = 0
+		text, invoke_kwargs = await prepare_cached_prompt(llm, prompt, CREATION_PROMPT.static_prefix, self.config.prompt_caching)
+		async for chunk in llm.astream(text, **invoke_kwargs):
+			aggregated_chunks = chunk if aggregated_chunks is None else aggregated_chunks + chunk
+			chunk_text = chunk.content if isinstance(chunk.content, str) else "".join(
+				part if isinstance(part, str) else part.get("text", "") for part in chunk.content)
+			content += chunk_text
+			for object_json in parser.feed(chunk_text):
+				try:
+					task = AgenticTaskWrapper.model_validate_json(object_json)
+				except ValidationError as e:
+					number_of_invalid_tasks += 1
+					debug(f"Skipping invalid streamed task {object_json}: {e}")
+					continue
+				if not decisions:
+					debug(f"First task streamed after {time.perf_counter() - start:.2f} sec.")
+				decisions.append(self.finalize_task_non_blocking(task, message = message))
+		self.llm_usage.record(aggregated_chunks, time.perf_counter() - start)
 		
-		
\ No newline at end of file
+		if decisions or (parser.saw_start_marker and number_of_invalid_tasks == 0):
+			self.output_statistics.record(OutputMode.tagged_json, parsed = True)
+			return await self.gather_finalized_tasks(decisions)
+		# no usable streamed objects (e.g. no <json> tag): fall back to parsing the complete answer
+		return await self._parse_and_finalize_tasks(content, message = message, prompt = prompt, llm = llm)
+	 
+	def finalize_task_non_blocking(self, task: AgenticTaskWrapper, message: Message) -> asyncio.Task[AgenticTaskWrapper | None]:
+		"""
+		Decide in the background whether task is a duplicate and finalize (== start) it if not, so the caller
+		can go on with the next task right away.
+		:return: the decision; it resolves to the task added to the pool (task or a revived archived task) or None for a duplicate
+		"""
+		return asyncio.create_task(self._finalize_task_unless_duplicate(task, message = message))
+	
+	@staticmethod
+	async def gather_finalized_tasks(decisions: list[asyncio.Task[AgenticTaskWrapper | None]]) -> list[AgenticTaskWrapper]:
+		return [task for task in await asyncio.gather(*decisions) if task is not None]
+	
+	async def _finalize_task_unless_duplicate(self, task: AgenticTaskWrapper, message: Message) -> AgenticTaskWrapper | None:
+		if self.agent_pool.check_for_duplicate(task):
+			return None
+		duplicate = await self.agent_pool.find_semantic_duplicate(task)
+		if duplicate is None:
+			await self.finalize_task(task, message = message, start_running = True)
+			return task
+		archived_task = self.agent_pool.archive.get(duplicate)
+		if archived_task is None or archived_task.result is None:
+			return None
+		# the question was answered before the task got evicted: show that result again instead of running an agent
+		self.agent_pool.take_from_archive(duplicate)
+		revived_task = archived_task.to_task(relevance_to_instructions = task.relevance_to_instructions, urgency = task.urgency)
+		await self.finalize_task(revived_task, message = message, start_running = False)
+		await revived_task.set_result(archived_task.result)
+		return revived_task
+	
+	async def finalize_task(self, task: AgenticTaskWrapper, message: Message, start_running: bool) -> None:
+		await task.finalize_task(agent_pool = self.agent_pool,
+		                         message = message,
+		                         callback_result_update = None,  # the summary board follows the pool's change events
+		                         start_running = start_running,
+		                         agent = self.agent)
@@ -6,8 +6,18 @@ from langchain_core.language_models import BaseChatModel
 from pydantic import BaseModel
 from pydantic.json_schema import SkipJsonSchema
 
+from source.agentic_tasks.agent_run_scheduler import AgentRunSchedulerConfig
+from source.agentic_tasks.hedged_execution import HedgedExecutionConfig
+from source.agentic_tasks.incremental_rating import IncrementalRatingConfig
+from source.agentic_tasks.loop_scheduler import LoopScheduleConfig
+from source.agentic_tasks.pool_snapshot import PoolSnapshotConfig
+from source.agentic_tasks.quick_access_context import QuickAccessContextConfig
+from source.agentic_tasks.relevance_prescorer import RelevancePrescoringConfig
+from source.agentic_tasks.sharded_rating import ShardedRatingConfig
 from source.chat.summary_of_previous_chat import SummaryOfPreviousChatConfig
+from source.prompt_caching import PromptCachingConfig
 from source.global_models import default_cheapest_model
+from source.structured_output import OutputMode
 
 class PossibleAiModels(str, Enum):
 	default_cheapest_model = "default_cheapest_model"
@@ -22,9 +32,27 @@ class AgentsConfig(BaseModel):
 	assistant_instructions: str = None
 	agent_relevance_threshold: float = 0.2
 	agent_destruction_threshold: float = 0.2  # Minimum relevance to consider a task active
+	agent_duplicate_similarity_threshold: float = 0.9  # cosine similarity above which a new task counts as duplicate
 	agents_number_shown_to_rater: int= 30
 	agents_number_shown_to_creater:int= 30
 	agent_pool_maximum_messages_to_keep_active: int = 50  # Maximum number of messages to keep in the pool
+	fused_create_and_rate: bool = False  # one LLM call per message creates new tasks and rates existing ones
+	stream_agent_creation: bool = True  # start each created task as soon as its JSON object is streamed
+	agent_creation_schedule: LoopScheduleConfig = LoopScheduleConfig()
+	agent_rating_schedule: LoopScheduleConfig = LoopScheduleConfig()
+	agent_relevance_prescoring: RelevancePrescoringConfig = RelevancePrescoringConfig()
+	agent_incremental_rating: IncrementalRatingConfig = IncrementalRatingConfig()
+	agent_sharded_rating: ShardedRatingConfig = ShardedRatingConfig()
+	agent_pool_snapshot: PoolSnapshotConfig = PoolSnapshotConfig()
+	agent_run_scheduler: AgentRunSchedulerConfig = AgentRunSchedulerConfig()
+	topic_scoped_task_context: bool = False  # give agents only the topic segments of the chat relevant to their task
+	topic_segments_per_task: int = 3  # including the most recent segment, which is always shown
+	agent_creation_output_mode: OutputMode = OutputMode.tagged_json
+	agent_rating_output_mode: OutputMode = OutputMode.tagged_json
+	agent_output_mode: OutputMode = OutputMode.tagged_json  # DefaultAgent, quick and agentic path
+	quick_access_context: QuickAccessContextConfig = QuickAccessContextConfig()
+	prompt_caching: PromptCachingConfig = PromptCachingConfig()
+	hedged_execution: HedgedExecutionConfig = HedgedExecutionConfig()  # DefaultAgent.run
 	
 	class Config:
 		arbitrary_types_allowed = True
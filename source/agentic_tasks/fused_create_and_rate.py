@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from langchain_core.exceptions import OutputParserException
+from langchain_openai import ChatOpenAI
+
+from source.agentic_tasks.agent_rater import AgentRater
+from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+from source.agentic_tasks.agentic_tasks_factory import AgenticTasksFactory
+from source.agentic_tasks.agents_config import AgentsConfig
+from source.agentic_tasks.loop_scheduler import LoopScheduler
+from source.agentic_tasks.prompt_templates import FUSED_CREATE_AND_RATE_PROMPT, fused_output_parser, render_tasks_with_ids
+from source.chat.message import Message
+from source.dev_logger import debug
+from source.global_models import default_thinking_model
+from source.llm_usage import LlmUsage
+from source.prompt_caching import prepare_cached_prompt
+
+
+class FusedAgentCreatorAndRater:
+	"""
+	Alternative to running AgenticTasksFactory and AgentRater separately (AgentsConfig.fused_create_and_rate):
+	one LLM call per message creates the new tasks and rescores the existing ones, since both
+	calls would send nearly the same prompt (instructions + chat context + task list).
+	Task finalization and rating application are delegated to the factory and the rater.
+	"""
+
+	def __init__(self, agent_tasks_factory: AgenticTasksFactory, agent_rater: AgentRater, config: AgentsConfig = None):
+		self.agent_tasks_factory: AgenticTasksFactory = agent_tasks_factory
+		self.agent_rater: AgentRater = agent_rater
+		self.agent_pool = agent_tasks_factory.agent_pool
+		self.config: AgentsConfig = config or agent_tasks_factory.config
+		self.latest_unprocessed_message: Message | None = None
+		self.latest_unprocessed_message_event: asyncio.Event = asyncio.Event()
+		self.scheduler: LoopScheduler = LoopScheduler(config = self.config.agent_creation_schedule, name = "fused agent creation and rating")
+		self.llm_usage: LlmUsage = LlmUsage()
+
+	def set_latest_unprocessed_message(self, message: Message):
+		self.latest_unprocessed_message = message
+		self.scheduler.register_update()
+		self.latest_unprocessed_message_event.set()
+
+	async def run_in_loop(self):
+		while True:
+			await self.latest_unprocessed_message_event.wait()
+			self.latest_unprocessed_message_event.clear()
+			message = await self.scheduler.wait_until_due(self.latest_unprocessed_message_event, lambda: self.latest_unprocessed_message)
+			if message is None:
+				continue
+			self.scheduler.mark_run(message)
+			debug(f"Creating and rating agents for message: {message.content}")
+			await self.create_and_rate(message)
+
+	async def create_and_rate(self, message: Message, llm: ChatOpenAI = None) -> list[AgenticTaskWrapper]:
+		llm = llm or self.config.get_agent_creation_llm()
+		parser = fused_output_parser
+		# queued runs are rated as well, so the run scheduler admits them in the order of their rating
+		active_agents = self.agent_pool.get_rating_candidates(maximum_number = self.config.agents_number_shown_to_rater)
+		tasks_not_to_create = await self.agent_tasks_factory.get_tasks_not_to_create(message)
+
+		prompt = FUSED_CREATE_AND_RATE_PROMPT.render(
+			assistant_instructions = self.config.assistant_instructions,
+			chat = message.get_chat_context(config = self.config.summarization_config, minimum_number_of_messages = self.config.minimum_number_of_unchanged_messages),
+			tasks = render_tasks_with_ids(active_agents),
+			tasks_not_to_create = tasks_not_to_create,
+		)
+
+		start = time.perf_counter()
+		text, invoke_kwargs = await prepare_cached_prompt(llm, prompt, FUSED_CREATE_AND_RATE_PROMPT.static_prefix, self.config.prompt_caching)
+		result = await llm.ainvoke(text, **invoke_kwargs)
+		self.llm_usage.record(result, time.perf_counter() - start)
+		content = result.content if isinstance(result.content, str) else result.content[-1]
+		json_string = content.split("<json>")[-1].split("</json>")[0].strip()
+		if not json_string:
+			return []
+		try:
+			parsed = parser.parse(json_string)
+		except OutputParserException as e:
+			debug(f"Error while parsing fused agent creation and rating: {json_string}")
+			debug(f"Error: {e}")
+			if llm is not default_thinking_model:
+				return await self.create_and_rate(message = message, llm = default_thinking_model)
+			raise e
+
+		self.agent_rater.apply_ratings(active_agents, parsed.ratings.agent_queries)
+		return await self.agent_tasks_factory.gather_finalized_tasks(
+			[self.agent_tasks_factory.finalize_task_non_blocking(task, message = message) for task in parsed.list_of_tasks])
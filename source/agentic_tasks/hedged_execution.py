@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from pydantic import BaseModel, Field
+
+
+class HedgedExecutionConfig(BaseModel):
+	enabled: bool = Field(default = False, description = "Start the agentic path of DefaultAgent in parallel when the quick path is slow, instead of after it.")
+	quick_path_deadline_sec: float = Field(default = 4.0, description = "Seconds the quick path may take before the agentic path is started in parallel.")
+	detect_empty_answer_early: bool = Field(default = True, description = "Stream the quick path and escalate as soon as it answers with an empty <json></json>.")
+
+
+@dataclass
+class HedgingStatistics:
+	"""How the hedged runs of DefaultAgent ended."""
+	number_of_runs: int = 0
+	number_of_hedged_runs: int = 0  # the quick path missed its deadline
+	number_of_early_escalations: int = 0  # empty <json></json> seen in the stream
+	number_of_quick_wins: int = 0
+	number_of_agentic_wins: int = 0
+	number_of_agentic_errors: int = 0  # the agentic path raised or returned its error result
+
+	def as_dict(self) -> dict[str, int]:
+		return {
+			"runs": self.number_of_runs,
+			"hedged": self.number_of_hedged_runs,
+			"early_escalations": self.number_of_early_escalations,
+			"quick_wins": self.number_of_quick_wins,
+			"agentic_wins": self.number_of_agentic_wins,
+			"agentic_errors": self.number_of_agentic_errors,
+		}
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+
+class IncrementalJsonArrayParser:
+	"""
+	Extracts the elements of the first JSON array in a streamed LLM answer as soon as they are complete.
+
+	Text before `start_marker` (e.g. thinking) is ignored. Only objects that are direct elements of the
+	first array are emitted, as raw JSON strings, so for {"list_of_tasks": [{...}, {...}]} every task
+	is returned right after its closing brace arrives.
+	"""
+
+	def __init__(self, start_marker: str | None = "<json>"):
+		self.start_marker: str | None = start_marker
+		self.saw_start_marker: bool = start_marker is None
+		self._pending_marker_text: str = ""
+		self._stack: list[str] = []  # open "{" and "[" of the current position
+		self._array_depth: int | None = None  # stack depth of the array whose elements are emitted
+		self._in_string: bool = False
+		self._escaped: bool = False
+		self._current_element: list[str] = []
+		self.finished: bool = False
+
+	def feed(self, text: str) -> list[str]:
+		if self.finished:
+			return []
+		if not self.saw_start_marker:
+			self._pending_marker_text += text
+			position = self._pending_marker_text.find(self.start_marker)
+			if position == -1:
+				# keep a tail, the marker may be split over two chunks
+				self._pending_marker_text = self._pending_marker_text[-len(self.start_marker):]
+				return []
+			self.saw_start_marker = True
+			text = self._pending_marker_text[position + len(self.start_marker):]
+			self._pending_marker_text = ""
+
+		completed: list[str] = []
+		for character in text:
+			collecting = self._array_depth is not None and len(self._stack) > self._array_depth
+			if collecting:
+				self._current_element.append(character)
+			if self._in_string:
+				if self._escaped:
+					self._escaped = False
+				elif character == "\\":
+					self._escaped = True
+				elif character == '"':
+					self._in_string = False
+				continue
+			if character == '"':
+				self._in_string = True
+			elif character in "{[":
+				self._stack.append(character)
+				if character == "[" and self._array_depth is None:
+					self._array_depth = len(self._stack)
+				elif len(self._stack) == (self._array_depth or 0) + 1:
+					self._current_element = [character]
+			elif character in "}]":
+				if not self._stack:
+					continue
+				self._stack.pop()
+				if self._array_depth is not None and len(self._stack) == self._array_depth and character == "}":
+					completed.append("".join(self._current_element))
+					self._current_element = []
+				elif self._array_depth is not None and len(self._stack) < self._array_depth:
+					self.finished = True
+					break
+		return completed
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel, Field
+
+from source.agentic_tasks.task_embedding_index import TaskEmbeddingIndex
+from source.chat.message import Message
+from source.dev_logger import debug
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+
+
+class IncrementalRatingConfig(BaseModel):
+	enabled: bool = Field(default = True, description = "Only send new tasks and tasks touched by the new messages to the rater.")
+	topic_similarity_threshold: float = Field(default = 0.3, description = "Cosine similarity between a task and the new messages above which the task counts as touched.")
+	maximum_versions_without_rating: int = Field(default = 10, description = "Rate a task at the latest after this many context versions, touched or not.")
+
+
+@dataclass
+class TaskRatingRecord:
+	context_version: int
+	relevance_to_instructions: float
+	urgency: float
+
+
+class RatingLedger:
+	"""
+	Remembers per task_id the last rating and the context version (== rating run) it was made at.
+	select_tasks_to_rate picks the tasks whose rating may be outdated: tasks never rated, tasks whose topic
+	the messages since the last run touch (embedding similarity), tasks not rated for too many versions and
+	tasks selected before but not rated (failed call, cancelled shard).
+	A version only completes (complete_version) once its ratings were applied; until then the messages of
+	a failed run still count as new for the next run.
+	"""
+
+	def __init__(self, index: TaskEmbeddingIndex, config: IncrementalRatingConfig):
+		self.index: TaskEmbeddingIndex = index
+		self.config: IncrementalRatingConfig = config
+		self.records: dict[str, TaskRatingRecord] = {}
+		self.context_version: int = 0
+		self._last_message_id: str | None = None
+		self._due_task_ids: set[str] = set()
+		self.number_of_candidates: int = 0
+		self.number_of_rated: int = 0
+
+	def new_chat_text(self, message: Message) -> str:
+		"""Messages since the last run; the last message of that run is included, as it may have grown."""
+		messages = message.get_most_recent_message().get_messages_until_condition(
+			break_condition = lambda m: m.message_id == self._last_message_id, included = True)
+		return "\n".join(f"{msg.sender}: {msg.content}" for msg in messages)
+
+	async def select_tasks_to_rate(self, tasks: list[AgenticTaskWrapper], message: Message) -> list[AgenticTaskWrapper]:
+		alive = {task.task_id for task in tasks}
+		for task_id in [task_id for task_id in self.records if task_id not in alive]:
+			del self.records[task_id]
+		self._due_task_ids &= alive
+		self.number_of_candidates += len(tasks)
+		if not self.config.enabled or not tasks:
+			self.number_of_rated += len(tasks)
+			return tasks
+
+		selected = []
+		touched_candidates = []
+		for task in tasks:
+			record = self.records.get(task.task_id)
+			if record is None or task.task_id in self._due_task_ids or \
+					self.context_version - record.context_version >= self.config.maximum_versions_without_rating:
+				selected.append(task)
+			else:
+				touched_candidates.append(task)
+		if touched_candidates:
+			task_vectors = await self.index.get_vectors([task.query_or_task for task in touched_candidates])
+			chat_vector = (await self.index.embed_transient([self.new_chat_text(message)]))[0]
+			similarities = task_vectors @ chat_vector
+			selected += [task for task, similarity in zip(touched_candidates, similarities) if similarity >= self.config.topic_similarity_threshold]
+		self.number_of_rated += len(selected)
+		# due until record() is called for them
+		self._due_task_ids.update(task.task_id for task in selected)
+		debug(f"Rating {len(selected)} of {len(tasks)} tasks in context version {self.context_version + 1}.")
+		return selected
+
+	def complete_version(self, message: Message) -> int:
+		"""Call after the ratings of a run were applied: the messages up to message count as rated."""
+		self.context_version += 1
+		self._last_message_id = message.get_most_recent_message().message_id
+		return self.context_version
+
+	def record(self, task: AgenticTaskWrapper) -> None:
+		self._due_task_ids.discard(task.task_id)
+		self.records[task.task_id] = TaskRatingRecord(
+			context_version = self.context_version + 1,  # the version the running rating completes
+			relevance_to_instructions = task.relevance_to_instructions,
+			urgency = task.urgency,
+		)
+
+	def statistics(self) -> dict[str, int]:
+		return {
+			"context_version": self.context_version,
+			"candidates": self.number_of_candidates,
+			"rated": self.number_of_rated,
+		}
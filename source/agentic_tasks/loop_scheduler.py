@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import Callable
+
+from pydantic import BaseModel, Field
+
+from source.chat.message import Message
+from source.dev_logger import debug
+
+_WORD = re.compile(r"[\w']+")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_FILLER_WORDS: frozenset[str] = frozenset({"uh", "uhm", "um", "umm", "er", "erm", "hmm", "mhm", "mm", "ah", "huh"})
+_FILLER_PHRASES: frozenset[str] = frozenset({"you know", "i mean"})
+_FILLER_PHRASE = re.compile(r"(?<= )(?:" + "|".join(re.escape(phrase) for phrase in _FILLER_PHRASES) + r")(?= )")
+# only filler when a sentence consists of nothing else ("Yeah, okay." vs. "Right, Friday then.")
+_ACKNOWLEDGEMENT_WORDS: frozenset[str] = frozenset({
+	"yeah", "yea", "yep", "yes", "ok", "okay", "sure", "alright", "right", "cool", "oh", "well", "so", "thanks",
+})
+
+
+class LoopScheduleConfig(BaseModel):
+	minimum_interval_sec: float = Field(default = 2.0, description = "Never run more often than this.")
+	maximum_staleness_sec: float = Field(default = 20.0, description = "Run at the latest this long after the first unprocessed change, even if only few new words arrived.")
+	minimum_new_words: int = Field(default = 6, description = "Number of new non filler words that makes a run due immediately.")
+
+
+class LoopScheduler:
+	"""
+	Decides when the factory/rater loops actually call the LLM.
+	A run is due when at least `minimum_new_words` new (non filler) words were said since the last run,
+	or when unprocessed words are older than `maximum_staleness_sec`; runs are at least `minimum_interval_sec` apart.
+	Updates that are coalesced into a later run are counted as skipped.
+	"""
+
+	def __init__(self, config: LoopScheduleConfig, name: str = "loop"):
+		self.config: LoopScheduleConfig = config
+		self.name: str = name
+		self._last_run_time: float | None = None
+		self._last_message_id: str | None = None
+		self._last_message_word_count: int = 0
+		self._first_unprocessed_update_time: float | None = None
+		self.number_of_updates: int = 0
+		self.number_of_runs: int = 0
+
+	@property
+	def number_of_skipped_runs(self) -> int:
+		return max(0, self.number_of_updates - self.number_of_runs)
+
+	@staticmethod
+	def count_words(message: Message) -> int:
+		"""Words of the message without disfluencies and without sentences that are only acknowledgements."""
+		number_of_words = 0
+		for sentence in _SENTENCE_SPLIT.split(message.content.lower()):
+			words = _FILLER_PHRASE.sub(" ", f" {' '.join(_WORD.findall(sentence))} ").split()
+			if all(word in _FILLER_WORDS or word in _ACKNOWLEDGEMENT_WORDS for word in words):
+				continue
+			number_of_words += sum(1 for word in words if word not in _FILLER_WORDS)
+		return number_of_words
+
+	def register_update(self) -> None:
+		self.number_of_updates += 1
+		if self._first_unprocessed_update_time is None:
+			self._first_unprocessed_update_time = time.monotonic()
+
+	def new_words_since_last_run(self, message: Message) -> int:
+		new_words = 0
+		current = message
+		while current is not None and current.message_id != self._last_message_id:
+			new_words += self.count_words(current)
+			current = current.previous_message
+		if current is not None:
+			# the message processed last time may have absorbed more words since then
+			new_words += self.count_words(current) - self._last_message_word_count
+		return new_words
+
+	def seconds_until_due(self, message: Message) -> float | None:
+		"""
+		:return: 0 if a run is due now, the seconds to wait otherwise, None if there is nothing new
+		"""
+		new_words = self.new_words_since_last_run(message)
+		if new_words <= 0:
+			return None
+		now = time.monotonic()
+		if self._last_run_time is not None and now - self._last_run_time < self.config.minimum_interval_sec:
+			return self.config.minimum_interval_sec - (now - self._last_run_time)
+		if new_words >= self.config.minimum_new_words:
+			return 0.0
+		staleness = now - (self._first_unprocessed_update_time or now)
+		return max(0.0, self.config.maximum_staleness_sec - staleness)
+
+	async def wait_until_due(self, event: asyncio.Event, get_latest_message: Callable[[], Message]) -> Message | None:
+		"""
+		Called after `event` fired. Waits (while further updates may arrive) until a run is due.
+		:return: the message to process or None if there is nothing worth processing
+		"""
+		while True:
+			message = get_latest_message()
+			delay = self.seconds_until_due(message)
+			if delay is None:
+				self._first_unprocessed_update_time = None
+				return None
+			if delay <= 0:
+				return message
+			try:
+				await asyncio.wait_for(event.wait(), timeout = delay)
+				event.clear()
+			except asyncio.TimeoutError:
+				pass
+
+	def mark_run(self, message: Message) -> None:
+		self.number_of_runs += 1
+		self._last_run_time = time.monotonic()
+		self._last_message_id = message.message_id
+		self._last_message_word_count = self.count_words(message)
+		self._first_unprocessed_update_time = None
+		debug(f"{self.name}: run {self.number_of_runs}, {self.number_of_skipped_runs} of {self.number_of_updates} updates skipped.")
+
+	def statistics(self) -> dict[str, int]:
+		return {
+			"updates": self.number_of_updates,
+			"runs": self.number_of_runs,
+			"skipped_runs": self.number_of_skipped_runs,
+		}
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from source.dev_logger import debug
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+
+
+class PoolEventType(str, Enum):
+	CREATED = "created"
+	RESCORED = "rescored"
+	RESULT = "result"
+	DEACTIVATED = "deactivated"
+	EVICTED = "evicted"
+
+
+@dataclass(frozen = True)
+class PoolEvent:
+	"""One change of a task in the AgentPool, with the values right after the change."""
+	type: PoolEventType
+	task_id: str
+	query_or_task: str
+	relevance: float
+	has_result: bool
+	timestamp: float = field(default_factory = time.time)
+
+	@classmethod
+	def from_task(cls, event_type: PoolEventType, task: AgenticTaskWrapper) -> PoolEvent:
+		return cls(
+			type = event_type,
+			task_id = task.task_id,
+			query_or_task = task.query_or_task,
+			relevance = task.get_relevance(),
+			has_result = bool(task.result),
+		)
+
+
+class PoolSubscription:
+	"""
+	Bounded buffer of one subscriber. Publishing never blocks: when the subscriber falls behind,
+	the oldest events are dropped (and counted), so a slow consumer cannot hold up the pool.
+	"""
+
+	def __init__(self, channel: PoolEventChannel, name: str, maximum_buffered: int):
+		self.channel: PoolEventChannel = channel
+		self.name: str = name
+		self._events: deque[PoolEvent] = deque(maxlen = maximum_buffered)
+		self._available: asyncio.Event = asyncio.Event()
+		self.number_of_dropped: int = 0
+		self.closed: bool = False
+
+	def __len__(self) -> int:
+		return len(self._events)
+
+	def put(self, event: PoolEvent) -> None:
+		if len(self._events) == self._events.maxlen:
+			self.number_of_dropped += 1
+		self._events.append(event)
+		self._available.set()
+
+	async def get_batch(self) -> list[PoolEvent]:
+		"""Wait for at least one event and return all buffered events, oldest first."""
+		while not self._events:
+			if self.closed:
+				return []
+			self._available.clear()
+			await self._available.wait()
+		events = list(self._events)
+		self._events.clear()
+		return events
+
+	def close(self) -> None:
+		self.channel.unsubscribe(self)
+		self.closed = True
+		self._available.set()
+
+
+class PoolEventChannel:
+	"""Fan-out of PoolEvents to all subscribers; every subscriber gets its own bounded buffer."""
+
+	def __init__(self):
+		self._subscriptions: list[PoolSubscription] = []
+		self.number_of_events: int = 0
+
+	def subscribe(self, name: str, maximum_buffered: int = 1000) -> PoolSubscription:
+		subscription = PoolSubscription(self, name = name, maximum_buffered = maximum_buffered)
+		self._subscriptions.append(subscription)
+		debug(f"'{name}' subscribed to agent pool events.")
+		return subscription
+
+	def unsubscribe(self, subscription: PoolSubscription) -> None:
+		if subscription in self._subscriptions:
+			self._subscriptions.remove(subscription)
+
+	def publish(self, event_type: PoolEventType, task: AgenticTaskWrapper) -> None:
+		self.number_of_events += 1
+		if not self._subscriptions:
+			return
+		event = PoolEvent.from_task(event_type, task)
+		for subscription in self._subscriptions:
+			subscription.put(event)
+
+	def statistics(self) -> dict[str, int]:
+		return {
+			"events": self.number_of_events,
+			**{f"dropped_{subscription.name}": subscription.number_of_dropped for subscription in self._subscriptions},
+		}
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+import numpy as np
+import ormsgpack
+from pydantic import BaseModel, Field
+
+from source.agentic_tasks.task_archive import ArchivedTask
+from source.agentic_tasks.task_status import TaskStatus
+from source.chat.message import Message
+from source.dev_logger import debug
+from source.locations_and_config import path_agent_pool_snapshot
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_pool import AgentPool
+	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+	from source.agentic_tasks.agentic_tasks_factory import AgenticTasksFactory
+
+SNAPSHOT_VERSION = 1
+
+
+class PoolSnapshotConfig(BaseModel):
+	enabled: bool = Field(default = False, description = "Periodically write the agent pool to disk and restore it on startup.")
+	interval_sec: float = Field(default = 10.0, description = "Seconds between two snapshots; unchanged pools are not written again.")
+	maximum_age_sec: float = Field(default = 1800.0, description = "Older snapshots are ignored on startup (most likely a different meeting).")
+	path: Path = path_agent_pool_snapshot
+
+
+def _message_to_dict(message: Message) -> dict[str, Any]:
+	return {
+		"message_id": message.message_id,
+		"conversation_id": message.conversation_id,
+		"sender": message.sender,
+		"content": message.content,
+		"time_start": message.time_start.isoformat() if message.time_start else None,
+		"time_end": message.time_end.isoformat() if message.time_end else None,
+	}
+
+
+def _task_to_dict(agent_pool: AgentPool, task: AgenticTaskWrapper) -> dict[str, Any]:
+	vector = agent_pool.task_embedding_index.get_vector(task.query_or_task)
+	return {
+		"task_id": task.task_id,
+		"query_or_task": task.query_or_task,
+		"category": task.category,
+		"relevance_to_instructions": task.relevance_to_instructions,
+		"urgency": task.urgency,
+		"forced_relevance": task.forced_relevance,
+		"status": TaskStatus(task.status).value,
+		"result": task.result.model_dump(mode = "json") if task.result else None,
+		"message_id": task.message.message_id if task.message is not None else None,
+		"relevant": task.query_or_task in agent_pool.relevant_agent_tasks,
+		"vector": vector,
+	}
+
+
+def _archived_task_to_dict(agent_pool: AgentPool, archived_task: ArchivedTask) -> dict[str, Any]:
+	vector = agent_pool.task_embedding_index.get_vector(archived_task.query_or_task)
+	return {
+		"task_id": archived_task.task_id,
+		"query_or_task": archived_task.query_or_task,
+		"category": archived_task.category,
+		"relevance_to_instructions": archived_task.relevance_to_instructions,
+		"urgency": archived_task.urgency,
+		"result": archived_task.result.model_dump(mode = "json") if archived_task.result else None,
+		"vector": vector,
+	}
+
+
+def collect_snapshot(agent_pool: AgentPool, latest_message: Message | None) -> dict[str, Any]:
+	"""
+	The conversation (without audio words), the live tasks with scores, status, results and embeddings, and
+	the archive as plain values, collected on the event loop; the embedding vectors are not copied (the index
+	replaces vectors instead of changing them), they are packed as bytes by pack_snapshot.
+	"""
+	messages = latest_message.get_most_recent_message().get_messages_until_condition(lambda m: False, included = False) if latest_message else []
+	return {
+		"version": SNAPSHOT_VERSION,
+		"messages": [_message_to_dict(message) for message in messages],
+		"tasks": [_task_to_dict(agent_pool, task) for task in agent_pool.agent_tasks.values()],
+		"archive": [_archived_task_to_dict(agent_pool, archived_task) for archived_task in agent_pool.archive.values()],
+	}
+
+
+def _pack_vector(value: Any) -> bytes:
+	if isinstance(value, np.ndarray):
+		return value.tobytes()
+	raise TypeError(f"Cannot pack {type(value)} into an agent pool snapshot.")
+
+
+def pack_snapshot(snapshot: dict[str, Any]) -> bytes:
+	"""MessagePack bytes of a collected snapshot; runs in a worker thread."""
+	return ormsgpack.packb(snapshot, default = _pack_vector)
+
+
+def _pack_and_write_atomically(path: Path, snapshot: dict[str, Any]) -> None:
+	_write_atomically(path, pack_snapshot(snapshot))
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+	path.parent.mkdir(parents = True, exist_ok = True)
+	temporary_path = path.with_suffix(path.suffix + ".tmp")
+	temporary_path.write_bytes(data)
+	os.replace(temporary_path, path)
+
+
+def load_snapshot(config: PoolSnapshotConfig) -> dict[str, Any] | None:
+	if not config.path.exists():
+		return None
+	age = time.time() - config.path.stat().st_mtime
+	if age > config.maximum_age_sec:
+		debug(f"Ignoring agent pool snapshot, it is {age:.0f} sec old.")
+		return None
+	try:
+		snapshot = ormsgpack.unpackb(config.path.read_bytes())
+	except (ormsgpack.MsgpackDecodeError, OSError) as e:
+		debug(f"Could not read agent pool snapshot {config.path}: {e}")
+		return None
+	if snapshot.get("version") != SNAPSHOT_VERSION:
+		return None
+	return snapshot
+
+
+def _restore_messages(snapshot: dict[str, Any]) -> dict[str, Message]:
+	messages_by_id: dict[str, Message] = {}
+	previous_message = None
+	for item in snapshot["messages"]:
+		message = Message(
+			message_id = item["message_id"],
+			conversation_id = item["conversation_id"],
+			sender = item["sender"],
+			content_as_string = item["content"],
+			time_start = item["time_start"],
+			time_end = item["time_end"],
+		)
+		if previous_message is not None:
+			previous_message.next_message = message
+			message.previous_message = previous_message
+		messages_by_id[message.message_id] = message
+		previous_message = message
+	return messages_by_id
+
+
+def _add_vector(agent_pool: AgentPool, item: dict[str, Any]) -> None:
+	if item["vector"] is not None:
+		agent_pool.task_embedding_index.add_vector(item["query_or_task"], np.frombuffer(item["vector"], dtype = np.float32))
+
+
+async def restore_pool(agent_tasks_factory: AgenticTasksFactory, snapshot: dict[str, Any]) -> Message | None:
+	"""
+	Rebuild the conversation and put the tasks back into the factory's pool, attached to their restored
+	messages. Finished tasks keep their results; tasks that had not finished yet are started again.
+	:return: the most recent restored message, to continue the conversation with
+	"""
+	# not at module level: agent_task_wrapper imports the AgentsConfig, which holds a PoolSnapshotConfig
+	from source.agentic_tasks.agent_task_wrapper import AgentTaskResult, AgenticTaskWrapper
+	agent_pool = agent_tasks_factory.agent_pool
+	messages_by_id = _restore_messages(snapshot)
+	latest_message = next(reversed(messages_by_id.values()), None)
+
+	for item in snapshot["archive"]:
+		_add_vector(agent_pool, item)
+		agent_pool.archive.add(ArchivedTask(
+			task_id = item["task_id"],
+			query_or_task = item["query_or_task"],
+			category = item["category"],
+			relevance_to_instructions = item["relevance_to_instructions"],
+			urgency = item["urgency"],
+			result = AgentTaskResult.model_validate(item["result"]) if item["result"] else None,
+		))
+
+	number_restarted = 0
+	for item in snapshot["tasks"]:
+		_add_vector(agent_pool, item)
+		task = AgenticTaskWrapper(
+			task_id = item["task_id"],
+			query_or_task = item["query_or_task"],
+			category = item["category"],
+			relevance_to_instructions = item["relevance_to_instructions"],
+			urgency = item["urgency"],
+			forced_relevance = item["forced_relevance"],
+		)
+		status = TaskStatus(item["status"])
+		restart = item["result"] is None and status in (TaskStatus.PENDING, TaskStatus.RUNNING)
+		await agent_tasks_factory.finalize_task(task, message = messages_by_id.get(item["message_id"], latest_message), start_running = restart)
+		number_restarted += restart
+		if restart:
+			continue
+		task.status = status
+		if item["result"] is not None:
+			task.result = AgentTaskResult.model_validate(item["result"])
+		if item["relevant"]:
+			agent_pool.sort_into_relevance(task)
+	debug(f"Restored {len(snapshot['tasks'])} tasks ({number_restarted} restarted), {len(snapshot['archive'])} archived tasks and {len(messages_by_id)} messages.")
+	return latest_message
+
+
+class PoolSnapshotter:
+	"""Writes the pool every interval_sec (if anything changed) and restores it on startup; the file's mtime is the snapshot time."""
+
+	def __init__(self, agent_tasks_factory: AgenticTasksFactory, get_latest_message: Callable[[], Message | None], config: PoolSnapshotConfig):
+		self.agent_tasks_factory: AgenticTasksFactory = agent_tasks_factory
+		self.get_latest_message: Callable[[], Message | None] = get_latest_message
+		self.config: PoolSnapshotConfig = config
+		self._last_saved_state: tuple | None = None
+		self._restored_message: Message | None = None
+		self.number_of_snapshots: int = 0
+
+	def _latest_message(self) -> Message | None:
+		# until the next message arrives, the restored conversation is the conversation
+		return self.get_latest_message() or self._restored_message
+
+	def _state(self) -> tuple:
+		"""
+		Cheap dirty marker: pool events and status changes, and the most recent message with its length
+		(messages grow while they absorb words).
+		"""
+		agent_pool = self.agent_tasks_factory.agent_pool
+		latest_message = self._latest_message()
+		most_recent_message = latest_message.get_most_recent_message() if latest_message is not None else None
+		return (
+			agent_pool.events.number_of_events,
+			agent_pool.number_of_status_changes,
+			most_recent_message.message_id if most_recent_message is not None else None,
+			len(most_recent_message.content) if most_recent_message is not None else 0,
+		)
+
+	async def save(self) -> bool:
+		state = self._state()
+		if state == self._last_saved_state:
+			return False
+		snapshot = collect_snapshot(self.agent_tasks_factory.agent_pool, self._latest_message())
+		await asyncio.to_thread(_pack_and_write_atomically, self.config.path, snapshot)
+		self._last_saved_state = state
+		self.number_of_snapshots += 1
+		return True
+
+	async def restore(self) -> Message | None:
+		snapshot = load_snapshot(self.config)
+		if snapshot is None:
+			return None
+		self._restored_message = await restore_pool(self.agent_tasks_factory, snapshot)
+		# the restored pool is what the file holds already
+		self._last_saved_state = self._state()
+		return self._restored_message
+
+	async def run_in_loop(self):
+		while True:
+			await asyncio.sleep(self.config.interval_sec)
+			try:
+				await self.save()
+			except Exception as e:
+				debug(f"Agent pool snapshot failed: {e}")
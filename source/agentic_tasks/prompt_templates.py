@@ -0,0 +1,225 @@
+"""
+Prompts and output schemas of the agent layer (factory, rater, fused creator/rater, DefaultAgent).
+
+Schemas, output parsers and their format instructions are built once at import. Every prompt is
+compiled once into its static text and named slots (written as <<name>>, so JSON schemas with curly
+braces can be part of the static text); rendering a prompt only joins the per-call values in.
+"""
+from __future__ import annotations
+
+import re
+from typing import List
+
+from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import BaseModel, Field
+
+from source.agentic_tasks.agent_task_wrapper import AgentTaskResult, AgenticTaskWrapper, ListOfAgenticTaskWrappers
+
+_SLOT = re.compile(r"<<(\w+)>>")
+
+
+class CompiledPrompt:
+	def __init__(self, template: str):
+		parts = _SLOT.split(template)
+		self._static_parts: list[str] = parts[0::2]
+		self.slot_names: list[str] = parts[1::2]
+
+	@property
+	def static_prefix(self) -> str:
+		"""The text before the first slot, byte-identical in every rendered prompt."""
+		return self._static_parts[0]
+
+	def render(self, **values: object) -> str:
+		rendered = [self._static_parts[0]]
+		for name, static_part in zip(self.slot_names, self._static_parts[1:]):
+			rendered.append(str(values[name]))
+			rendered.append(static_part)
+		return "".join(rendered)
+
+
+# ---------------------------------------------------------------------------
+# Output schemas
+# ---------------------------------------------------------------------------
+_field_info_relevance = AgenticTaskWrapper.model_fields.get("relevance_to_instructions")
+_field_info_urgency = AgenticTaskWrapper.model_fields.get("urgency")
+assert not (_field_info_relevance is None or _field_info_urgency is None), "Relevance and urgency fields must be defined in AgentTaskQuery model."
+
+
+class RatingOfAgentTask(BaseModel):
+	task_id: str = Field(description = "Id of the rated task, as written in front of the task.")
+	relevance_to_instructions: float = Field(default = 0.0, description = getattr(_field_info_relevance, "description", "Relevance of the task to the current context."))
+	urgency: float = Field(default = 0.0, description = getattr(_field_info_urgency, "description", "Urgency of the task in the current context."))
+
+
+class ListOfAgentTaskRatings(BaseModel):
+	agent_queries: list[RatingOfAgentTask] = Field(
+		default_factory = list,
+		description = "List of agent tasks with their relevance and urgency scores."
+	)
+
+
+class FusedCreateAndRateResult(BaseModel):
+	list_of_tasks: List[AgenticTaskWrapper] = Field(
+		default_factory = list,
+		description = "New tasks to create. Empty if no new task is needed.")
+	ratings: ListOfAgentTaskRatings = Field(
+		default_factory = ListOfAgentTaskRatings,
+		description = "Updated relevance and urgency of the existing tasks, referenced by their task_id.")
+
+
+rating_output_parser = PydanticOutputParser(pydantic_object = ListOfAgentTaskRatings)
+task_list_output_parser = ListOfAgenticTaskWrappers.get_pydantic_output_parser()
+fused_output_parser = PydanticOutputParser(pydantic_object = FusedCreateAndRateResult)
+agent_task_result_output_parser = PydanticOutputParser(pydantic_object = AgentTaskResult)
+
+RATING_FORMAT_INSTRUCTIONS = rating_output_parser.get_format_instructions()
+TASK_LIST_FORMAT_INSTRUCTIONS = task_list_output_parser.get_format_instructions()
+FUSED_FORMAT_INSTRUCTIONS = fused_output_parser.get_format_instructions()
+AGENT_TASK_RESULT_FORMAT_INSTRUCTIONS = agent_task_result_output_parser.get_format_instructions()
+
+
+def render_tasks_with_ids(tasks: list[AgenticTaskWrapper]) -> str:
+	return str([f"{task.task_id}: {task.query_or_task}" for task in tasks])
+
+
+# ---------------------------------------------------------------------------
+# Prompts
+# ---------------------------------------------------------------------------
+# Every prompt exists twice: for OutputMode.tagged_json with the <json> output contract and the format
+# instructions, and for OutputMode.native without them (the schema is passed to the provider instead).
+# Layout: the static text (role, rules, output contract, schema) comes first and is the same for every
+# call, followed by the slots from the longest lived (assistant instructions) to the most volatile (chat,
+# task). Providers with prefix caching then reuse the static_prefix, see source/prompt_caching.py.
+_RATING_HEADER = (
+	"you are supposed to rate how relevant the tasks below are to the current conext and instructions."
+	" be aware that, when the instructions tell you, e.g. provide 3 actionable steps, that means all steps more than 3 will have 0 urgency.\n"
+	"you are supposed to give me a list of of python object representing relevance and urgency.\n"
+)
+_RATING_CONTEXT = (
+	"<assistance_instructions><<assistant_instructions>></assistance_instructions>\n"
+	"<tasks>\n"
+	"<<tasks>>\n"
+	"</tasks>\n"
+	"Here is the chat you need for rating:\n<chat><<chat>></chat>\n"
+)
+RATING_PROMPT = CompiledPrompt(
+	_RATING_HEADER +
+	"the output should be in the following form:\n"
+	"<json>\n"
+	"RESULT\n"
+	"</json>\n"
+	"RESULT shale have the following structure:\n"
+	f"{RATING_FORMAT_INSTRUCTIONS}\n"
+	"you may think first (only very shortly because of latency). Put your thinking into <thinking>...</thinking> tag. the result in <json>...</json> tag.\n" +
+	_RATING_CONTEXT
+)
+RATING_PROMPT_NATIVE = CompiledPrompt(_RATING_HEADER + _RATING_CONTEXT)
+
+_CREATION_HEADER = (
+	"you create agent tasks according to the assistance_instructions taking_into_account_the_context_and_the_chat.\n"
+	"previously you already have created such tasks (tasks_not_to_create). you shall not create duplicates or near duplicates of those tasks.\n"
+	"if you deem it appropriate. you now can create a new task in case you think thumbsting similar does not already exist.\n"
+)
+_CREATION_CONTEXT = (
+	"<assistance_instructions><<assistant_instructions>></assistance_instructions>\n"
+	"<tasks_not_to_create><<tasks_not_to_create>></tasks_not_to_create>\n"
+	"<chat><<chat>></chat>\n"
+)
+CREATION_PROMPT = CompiledPrompt(
+	_CREATION_HEADER +
+	"your output shall be put into <json> tags in the following form:\n"
+	"<json>ResultHere</json>\n"
+	f"ResultHere shall suffice {TASK_LIST_FORMAT_INSTRUCTIONS}\n" +
+	_CREATION_CONTEXT
+)
+CREATION_PROMPT_NATIVE = CompiledPrompt(_CREATION_HEADER + _CREATION_CONTEXT)
+
+FUSED_CREATE_AND_RATE_PROMPT = CompiledPrompt(
+	"you do two things at once according to the assistance_instructions, taking into account the chat:\n"
+	"1. create new agent tasks (list_of_tasks) in case nothing similar exists yet. you shall not create duplicates or near duplicates of the tasks_not_to_create.\n"
+	"2. rate how relevant and urgent the existing tasks (given as task_id: task) are right now (ratings)."
+	" be aware that, when the instructions tell you, e.g. provide 3 actionable steps, that means all steps more than 3 will have 0 urgency.\n"
+	"your output shall be put into <json> tags in the following form:\n"
+	"<json>ResultHere</json>\n"
+	f"ResultHere shall suffice {FUSED_FORMAT_INSTRUCTIONS}\n"
+	"<assistance_instructions><<assistant_instructions>></assistance_instructions>\n"
+	"<tasks_not_to_create><<tasks_not_to_create>></tasks_not_to_create>\n"
+	"<tasks>\n"
+	"<<tasks>>\n"
+	"</tasks>\n"
+	"<chat><<chat>></chat>\n"
+)
+
+QUICK_RESULT_QUICK_ACCESS_SECTION = CompiledPrompt(
+	"Context from quick access info:\n"
+	"<quick_access_info><<quick_access_info>></quick_access_info>\n"
+)
+
+_QUICK_RESULT_CONTEXT = (
+	"Context from previous chat:\n"
+	"<chat><<chat>></chat>\n"
+	"<<quick_access_section>>"
+	"Context from current task:\n"
+	"You're given the following query or task: <query_or_task><<query_or_task>></query_or_task>.\n"
+)
+QUICK_RESULT_PROMPT = CompiledPrompt(
+	"You are a concise assistant.\n"
+	"If you can answer without external lookup, do so.\n"
+	"If you think you need to look something up, answer with empty <json></json>.\n"
+	"Put your answer in <json>...</json> tags.\n"
+	"Your answer must match this schema:\n"
+	f"{AGENT_TASK_RESULT_FORMAT_INSTRUCTIONS}\n\n" +
+	_QUICK_RESULT_CONTEXT
+)
+QUICK_RESULT_PROMPT_NATIVE = CompiledPrompt(
+	"You are a concise assistant.\n"
+	"If you can answer without external lookup, do so.\n"
+	"If you need to look up info, set more_info_needed to true.\n\n" +
+	_QUICK_RESULT_CONTEXT
+)
+
+AGENTIC_CONTEXT_QUICK_ACCESS_SECTION = CompiledPrompt(
+	"Context from quick access info:\n"
+	"<quick_access_info>\n"
+	"<<quick_access_info>>\n"
+	"</quick_access_info>\n\n"
+)
+
+_AGENTIC_HEADER = (
+	"You are a careful, precise assistant.\n"
+	"When you cite local files, use bracketed numeric citations like [1], [2].\n"
+	"If you use tools, incorporate their outputs faithfully.\n\n"
+)
+_AGENTIC_CONTEXT = (
+	"Context from previous chat:\n"
+	"<chat>\n"
+	"<<chat>>\n"
+	"</chat>\n\n"
+	"<<quick_access_section>>"
+	"Current task:\n"
+	"<query_or_task><<query_or_task>></query_or_task>\n"
+)
+AGENTIC_CONTEXT_PROMPT = CompiledPrompt(
+	_AGENTIC_HEADER +
+	"Put your final answer inside <json>...</json> tags.\n"
+	"Your answer must satisfy the following Pydantic schema:\n"
+	f"{AGENT_TASK_RESULT_FORMAT_INSTRUCTIONS}\n\n" +
+	_AGENTIC_CONTEXT
+)
+AGENTIC_CONTEXT_PROMPT_NATIVE = CompiledPrompt(_AGENTIC_HEADER + _AGENTIC_CONTEXT)
+
+_REACT_AGENT_INSTRUCTIONS = (
+	"You are a precise ReAct agent.\n"
+	"Use tools when they can materially improve accuracy.\n"
+	"Prefer the LocalFilesRAG tool for any query that might be answered from local documents. "
+	"But of course you may also answer yourself in case the tools don't provide answers and you are pretty sure."
+)
+REACT_AGENT_SYSTEM_PROMPT = (
+	_REACT_AGENT_INSTRUCTIONS +
+	"When you produce the final answer, it MUST be enclosed in <json>...</json> and conform to the provided schema.\n"
+	"Include bracketed citations like [1], [2] when drawing on local files."
+)
+REACT_AGENT_SYSTEM_PROMPT_NATIVE = (
+	_REACT_AGENT_INSTRUCTIONS + "\n"
+	"Include bracketed citations like [1], [2] when drawing on local files."
+)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pydantic import BaseModel, Field
+
+from source.agentic_tasks.task_embedding_index import TaskEmbeddingIndex
+from source.dev_logger import debug
+
+
+class QuickAccessContextConfig(BaseModel):
+	retrieval: bool = Field(default = True, description = "Give each task only the passages of the quick access file relevant to it instead of the whole file.")
+	number_of_passages: int = Field(default = 4, description = "Passages of the quick access file per task prompt.")
+	chunk_size: int = Field(default = 800, description = "Characters per passage.")
+	chunk_overlap: int = Field(default = 100, description = "Characters shared by neighbouring passages.")
+	full_text_below_characters: int = Field(default = 2000, description = "Smaller files are always given as a whole.")
+	check_interval_sec: float = Field(default = 2.0, description = "Seconds between two checks of the file's mtime.")
+
+
+@dataclass
+class _LoadedFile:
+	text: str = ""
+	passages: list[str] = field(default_factory = list)
+	position_by_passage: dict[str, int] = field(default_factory = dict)
+	index: TaskEmbeddingIndex | None = None  # embedded on the first retrieval
+
+
+class QuickAccessContext:
+	"""
+	The quick access file, read once and re-read (in a thread) only when its mtime changes.
+	Shared by all sessions that split it the same way (chunk_size, chunk_overlap); everything else comes from
+	the config of the caller. Its passages are embedded on the first retrieval, so a task gets the
+	number_of_passages passages most similar to its query, in the order they appear in the file.
+	"""
+	_contexts_by_path: dict[tuple[Path, int, int], QuickAccessContext] = {}
+
+	def __init__(self, path: Path, chunk_size: int, chunk_overlap: int):
+		self.path: Path = path
+		self.chunk_size: int = chunk_size
+		self.chunk_overlap: int = chunk_overlap
+		self._loaded: _LoadedFile = _LoadedFile()
+		self._mtime: float | None = None
+		self._last_check: float = 0.0
+		self._lock: asyncio.Lock = asyncio.Lock()
+		self.number_of_loads: int = 0
+
+	@classmethod
+	def for_path(cls, path: Path, config: QuickAccessContextConfig) -> QuickAccessContext:
+		key = (path, config.chunk_size, config.chunk_overlap)
+		if key not in cls._contexts_by_path:
+			cls._contexts_by_path[key] = QuickAccessContext(path, chunk_size = config.chunk_size, chunk_overlap = config.chunk_overlap)
+		return cls._contexts_by_path[key]
+
+	@staticmethod
+	def _read(path: Path) -> tuple[float | None, str]:
+		if not path.exists():
+			return None, ""
+		return path.stat().st_mtime, path.read_text()
+
+	@staticmethod
+	def _mtime_of(path: Path) -> float | None:
+		return path.stat().st_mtime if path.exists() else None
+
+	async def _refresh(self, check_interval_sec: float) -> None:
+		now = time.monotonic()
+		if now - self._last_check < check_interval_sec:
+			return
+		async with self._lock:
+			if now - self._last_check < check_interval_sec:
+				return
+			mtime = await asyncio.to_thread(self._mtime_of, self.path)
+			if mtime != self._mtime:
+				mtime, text = await asyncio.to_thread(self._read, self.path)
+				self._load(text)
+				self._mtime = mtime
+			self._last_check = time.monotonic()
+
+	def _load(self, text: str) -> None:
+		splitter = RecursiveCharacterTextSplitter(chunk_size = self.chunk_size, chunk_overlap = self.chunk_overlap)
+		passages = list(dict.fromkeys(splitter.split_text(text))) if text.strip() else []
+		self._loaded = _LoadedFile(text = text, passages = passages,
+		                           position_by_passage = {passage: position for position, passage in enumerate(passages)})
+		self.number_of_loads += 1
+		debug(f"Loaded quick access info {self.path}: {len(text)} characters in {len(passages)} passages.")
+
+	async def _get_index(self, loaded: _LoadedFile) -> TaskEmbeddingIndex:
+		if loaded.index is None:
+			async with self._lock:
+				if loaded.index is None:
+					index = TaskEmbeddingIndex()
+					await index.add(loaded.passages)
+					loaded.index = index
+		return loaded.index
+
+	async def get_context(self, query_or_task: str, config: QuickAccessContextConfig) -> str:
+		"""
+		:param config: the caller's config (retrieval, number_of_passages, full_text_below_characters, check_interval_sec)
+		:return: the passages relevant to query_or_task (or the whole file if it is small), "" if there is no file
+		"""
+		await self._refresh(config.check_interval_sec)
+		# one consistent version of the file, even if it is reloaded while the passages are searched
+		loaded = self._loaded
+		if not config.retrieval or len(loaded.text) < config.full_text_below_characters:
+			return loaded.text
+		matches = await (await self._get_index(loaded)).search(query_or_task, k = config.number_of_passages)
+		positions = sorted(loaded.position_by_passage[passage] for passage, _ in matches)
+		return "\n...\n".join(loaded.passages[position] for position in positions)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+
+
+class RankedTaskIndex:
+	"""
+	Keys ordered by descending score, kept sorted on every update (binary search + list insert),
+	so reading the top k is a slice: O(k). Ties keep the order in which the keys were first added.
+	"""
+
+	def __init__(self):
+		self._entries: list[tuple[float, int, str]] = []  # (-score, sequence, key), ascending
+		self._entry_by_key: dict[str, tuple[float, int, str]] = {}
+		self._sequence = itertools.count()
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def __contains__(self, key: str) -> bool:
+		return key in self._entry_by_key
+
+	def update(self, key: str, score: float) -> None:
+		"""Insert key or move it to its new score."""
+		old_entry = self._entry_by_key.get(key)
+		if old_entry is not None:
+			if old_entry[0] == -score:
+				return
+			self._remove_entry(old_entry)
+		entry = (-score, old_entry[1] if old_entry is not None else next(self._sequence), key)
+		bisect.insort(self._entries, entry)
+		self._entry_by_key[key] = entry
+
+	def remove(self, key: str) -> None:
+		entry = self._entry_by_key.pop(key, None)
+		if entry is not None:
+			self._remove_entry(entry)
+
+	def _remove_entry(self, entry: tuple[float, int, str]) -> None:
+		position = bisect.bisect_left(self._entries, entry)
+		del self._entries[position]
+
+	def top(self, k: int) -> list[str]:
+		return [key for _, _, key in self._entries[:max(0, k)]]
+
+	def clear(self) -> None:
+		self._entries.clear()
+		self._entry_by_key.clear()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from source.agentic_tasks.task_embedding_index import TaskEmbeddingIndex
+from source.chat.message import Message
+from source.dev_logger import debug
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+
+
+class RelevancePrescoringConfig(BaseModel):
+	enabled: bool = Field(default = False, description = "Only call the LLM rater when the locally pre-scored ranking changed (or on refresh).")
+	number_of_top_tasks: int = Field(default = 10, description = "Length of the top of the ranking that is compared between runs.")
+	minimum_ranking_change: float = Field(default = 0.25, ge = 0.0, le = 1.0,
+	                                      description = "Normalized rank distance (0 == same top tasks in the same order, 1 == disjoint) that triggers an LLM rating.")
+	refresh_interval_sec: float = Field(default = 60.0, description = "Rate with the LLM at least this often while messages arrive.")
+	chat_window_messages: int = Field(default = 5, description = "Number of recent messages the tasks are compared to.")
+
+
+class RelevancePrescorer:
+	"""
+	Local relevance estimate of all tasks: cosine similarity between the task embeddings (shared with the
+	duplicate detection through the TaskEmbeddingIndex) and the embedding of the recent chat window,
+	computed as one matrix-vector product. The LLM rater is only needed when the top of this ranking moved.
+	"""
+
+	def __init__(self, index: TaskEmbeddingIndex, config: RelevancePrescoringConfig):
+		self.index: TaskEmbeddingIndex = index
+		self.config: RelevancePrescoringConfig = config
+		self._rated_ranking: list[str] | None = None
+		self._last_rating_time: float | None = None
+		self.number_of_checks: int = 0
+		self.number_of_skipped_ratings: int = 0
+
+	async def score(self, tasks: list[AgenticTaskWrapper], message: Message) -> np.ndarray:
+		"""
+		:return: cosine similarity of every task to the recent chat window, in the order of tasks
+		"""
+		if not tasks:
+			return np.zeros(0, dtype = np.float32)
+		task_vectors = await self.index.get_vectors([task.query_or_task for task in tasks])
+		chat_vector = (await self.index.embed_transient([message.get_recent_chat_window(self.config.chat_window_messages)]))[0]
+		return task_vectors @ chat_vector
+
+	async def rank(self, tasks: list[AgenticTaskWrapper], message: Message) -> list[str]:
+		"""query_or_task of the top tasks, most similar to the chat first."""
+		scores = await self.score(tasks, message)
+		top = np.argsort(-scores, kind = "stable")[:self.config.number_of_top_tasks]
+		return [tasks[i].query_or_task for i in top]
+
+	@staticmethod
+	def ranking_change(previous: list[str], current: list[str]) -> float:
+		"""
+		Normalized Spearman footrule distance between two top-k lists; a task missing in one of the lists
+		counts as ranked at position k there.
+		"""
+		k = max(len(previous), len(current))
+		if k == 0:
+			return 0.0
+		previous_ranks = {key: rank for rank, key in enumerate(previous)}
+		current_ranks = {key: rank for rank, key in enumerate(current)}
+		distance = sum(abs(previous_ranks.get(key, k) - current_ranks.get(key, k)) for key in previous_ranks.keys() | current_ranks.keys())
+		return distance / (k * (k + 1))
+
+	async def needs_rating(self, tasks: list[AgenticTaskWrapper], message: Message) -> bool:
+		if not self.config.enabled:
+			return True
+		self.number_of_checks += 1
+		ranking = await self.rank(tasks, message)
+		if self._rated_ranking is None or self._last_rating_time is None:
+			reason = "first rating"
+		elif time.monotonic() - self._last_rating_time >= self.config.refresh_interval_sec:
+			reason = "periodic refresh"
+		elif (change := self.ranking_change(self._rated_ranking, ranking)) >= self.config.minimum_ranking_change:
+			reason = f"ranking change {change:.2f}"
+		else:
+			self.number_of_skipped_ratings += 1
+			debug(f"Skipping LLM rating, pre-scored ranking changed by {change:.2f} ({self.number_of_skipped_ratings} of {self.number_of_checks} skipped).")
+			return False
+		debug(f"LLM rating needed: {reason}.")
+		self._rated_ranking = ranking
+		self._last_rating_time = time.monotonic()
+		return True
+
+	def statistics(self) -> dict[str, int]:
+		return {
+			"checks": self.number_of_checks,
+			"skipped_ratings": self.number_of_skipped_ratings,
+		}
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+	from source.agentic_tasks.prompt_templates import RatingOfAgentTask
+
+
+class ShardedRatingConfig(BaseModel):
+	enabled: bool = Field(default = False, description = "Rate all active tasks in concurrent shards instead of only the agents_number_shown_to_rater most relevant ones.")
+	shard_size: int = Field(default = 15, description = "Tasks per rating prompt, calibration anchors included.")
+	maximum_parallel_shards: int = Field(default = 4, description = "Rating calls in flight at the same time.")
+	latency_budget_sec: float = Field(default = 20.0, description = "Shards not rated within this time are cancelled; their tasks stay due for the next run.")
+	number_of_anchors: int = Field(default = 2, description = "Tasks rated in every shard to calibrate the shards against each other.")
+
+
+def split_into_shards(tasks: list[AgenticTaskWrapper], config: ShardedRatingConfig) -> tuple[list[AgenticTaskWrapper], list[list[AgenticTaskWrapper]]]:
+	"""
+	The most relevant tasks are the anchors. The first shard holds them as regular members and is the
+	reference; every other shard holds the anchors plus its own slice of the remaining tasks.
+	:return: (anchors, shards)
+	"""
+	tasks = sorted(tasks, key = lambda task: task.get_relevance(), reverse = True)
+	number_of_anchors = min(config.number_of_anchors, max(0, config.shard_size - 1), len(tasks))
+	anchors = tasks[:number_of_anchors]
+	shards = [tasks[:config.shard_size]]
+	slice_size = config.shard_size - number_of_anchors
+	for start in range(config.shard_size, len(tasks), slice_size):
+		shards.append(anchors + tasks[start:start + slice_size])
+	return anchors, shards
+
+
+def calibrate_shard(ratings: list[RatingOfAgentTask], anchor_ids: set[str], reference: dict[str, tuple[float, float]]) -> list[RatingOfAgentTask]:
+	"""
+	Shift relevance and urgency of a shard by the mean difference between the reference ratings of the
+	anchors and the ratings the anchors got in this shard, so scores of different prompts are comparable.
+	:param reference: task_id -> (relevance_to_instructions, urgency) of the anchors
+	:return: calibrated ratings of the shard's own tasks (anchors removed)
+	"""
+	anchor_ratings = [rating for rating in ratings if rating.task_id in anchor_ids and rating.task_id in reference]
+	own_ratings = [rating for rating in ratings if rating.task_id not in anchor_ids]
+	if not anchor_ratings:
+		return own_ratings
+	relevance_shift = sum(reference[rating.task_id][0] - rating.relevance_to_instructions for rating in anchor_ratings) / len(anchor_ratings)
+	urgency_shift = sum(reference[rating.task_id][1] - rating.urgency for rating in anchor_ratings) / len(anchor_ratings)
+	return [
+		rating.model_copy(update = {
+			"relevance_to_instructions": min(1.0, max(-1.0, rating.relevance_to_instructions + relevance_shift)),
+			"urgency": min(1.0, max(-1.0, rating.urgency + urgency_shift)),
+		})
+		for rating in own_ratings
+	]
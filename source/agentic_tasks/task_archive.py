@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from source.agentic_tasks.agent_task_wrapper import AgentTaskResult, AgenticTaskWrapper
+
+
+@dataclass
+class ArchivedTask:
+	"""
+	What is left of a task evicted from the live AgentPool: no Message, callbacks or asyncio tasks.
+	Its embedding stays in the pool's TaskEmbeddingIndex under query_or_task.
+	"""
+	task_id: str
+	query_or_task: str
+	category: str
+	relevance_to_instructions: float
+	urgency: float
+	result: AgentTaskResult | None
+
+	@classmethod
+	def from_task(cls, task: AgenticTaskWrapper) -> ArchivedTask:
+		return cls(
+			task_id = task.task_id,
+			query_or_task = task.query_or_task,
+			category = task.category,
+			relevance_to_instructions = task.relevance_to_instructions,
+			urgency = task.urgency,
+			result = task.result or None,
+		)
+
+	def to_task(self, relevance_to_instructions: float, urgency: float) -> AgenticTaskWrapper:
+		"""A new (not finalized) task with the archived query, to bring an archived result back to the board."""
+		from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper
+		return AgenticTaskWrapper(
+			task_id = self.task_id,
+			query_or_task = self.query_or_task,
+			category = self.category,
+			relevance_to_instructions = relevance_to_instructions,
+			urgency = urgency,
+		)
+
+
+class TaskArchive:
+	"""Archived tasks by query_or_task, oldest first; bounded to maximum_size entries."""
+
+	def __init__(self, maximum_size: int = 10000):
+		self.maximum_size: int = maximum_size
+		self._tasks: OrderedDict[str, ArchivedTask] = OrderedDict()
+
+	def __len__(self) -> int:
+		return len(self._tasks)
+
+	def __contains__(self, query_or_task: str) -> bool:
+		return query_or_task in self._tasks
+
+	def values(self) -> list[ArchivedTask]:
+		return list(self._tasks.values())
+
+	def get(self, query_or_task: str) -> ArchivedTask | None:
+		return self._tasks.get(query_or_task)
+
+	def add(self, archived_task: ArchivedTask) -> list[str]:
+		"""
+		:return: query_or_task of the archived tasks dropped to stay within maximum_size
+		"""
+		self._tasks[archived_task.query_or_task] = archived_task
+		self._tasks.move_to_end(archived_task.query_or_task)
+		dropped = []
+		while len(self._tasks) > self.maximum_size:
+			query_or_task, _ = self._tasks.popitem(last = False)
+			dropped.append(query_or_task)
+		return dropped
+
+	def take(self, query_or_task: str) -> ArchivedTask | None:
+		return self._tasks.pop(query_or_task, None)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from source.global_models import base_embeddings, cached_embeddings
+
+
+class TaskEmbeddingIndex:
+	"""
+	In-memory FAISS index (inner product over l2 normalized vectors == cosine similarity)
+	of the queries of agent tasks, addressed by the query_or_task string used as key in the AgentPool.
+	Embeddings go through cached_embeddings, so embedding the same text again is free.
+	Texts that are embedded once and never again (chat windows) go through embed_transient instead,
+	so they do not grow the cache.
+	"""
+
+	def __init__(self, embeddings: Embeddings = cached_embeddings, transient_embeddings: Embeddings = base_embeddings):
+		self.embeddings: Embeddings = embeddings
+		self.transient_embeddings: Embeddings = transient_embeddings
+		self._index: faiss.IndexIDMap | None = None
+		self._ids_by_key: dict[str, int] = {}
+		self._keys_by_id: dict[int, str] = {}
+		self._vectors_by_key: dict[str, np.ndarray] = {}
+		self._next_id: int = 0
+		self.lock: asyncio.Lock = asyncio.Lock()
+
+	def __len__(self) -> int:
+		return len(self._ids_by_key)
+
+	def __contains__(self, key: str) -> bool:
+		return key in self._ids_by_key
+
+	def keys(self) -> list[str]:
+		return list(self._ids_by_key)
+
+	@staticmethod
+	def normalize(vectors: np.ndarray) -> np.ndarray:
+		vectors = np.asarray(vectors, dtype = np.float32)
+		return vectors / np.maximum(np.linalg.norm(vectors, axis = -1, keepdims = True), 1e-12)
+
+	async def embed(self, texts: list[str]) -> np.ndarray:
+		if not texts:
+			return np.zeros((0, 0), dtype = np.float32)
+		return self.normalize(np.asarray(await self.embeddings.aembed_documents(texts), dtype = np.float32))
+
+	async def embed_transient(self, texts: list[str]) -> np.ndarray:
+		"""Like embed, but not cached; for texts that change with every call, e.g. the recent chat window."""
+		if not texts:
+			return np.zeros((0, 0), dtype = np.float32)
+		return self.normalize(np.asarray(await self.transient_embeddings.aembed_documents(texts), dtype = np.float32))
+
+	def add_vector(self, key: str, vector: np.ndarray) -> None:
+		if key in self._ids_by_key:
+			self.remove(key)
+		vector = self.normalize(vector).reshape(1, -1)
+		if self._index is None:
+			self._index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+		faiss_id = self._next_id
+		self._next_id += 1
+		self._index.add_with_ids(vector, np.asarray([faiss_id], dtype = np.int64))
+		self._ids_by_key[key] = faiss_id
+		self._keys_by_id[faiss_id] = key
+		self._vectors_by_key[key] = vector[0]
+
+	async def add(self, keys: list[str]) -> None:
+		missing = [key for key in keys if key not in self._ids_by_key]
+		for key, vector in zip(missing, await self.embed(missing)):
+			self.add_vector(key, vector)
+
+	def remove(self, key: str) -> None:
+		faiss_id = self._ids_by_key.pop(key, None)
+		if faiss_id is None:
+			return
+		del self._keys_by_id[faiss_id]
+		del self._vectors_by_key[key]
+		self._index.remove_ids(np.asarray([faiss_id], dtype = np.int64))
+
+	def get_vector(self, key: str) -> np.ndarray | None:
+		return self._vectors_by_key.get(key)
+
+	async def get_vectors(self, keys: list[str]) -> np.ndarray:
+		"""
+		Vectors of keys as rows of a matrix; keys not in the index yet are embedded and added.
+		"""
+		if any(key not in self._vectors_by_key for key in keys):
+			async with self.lock:
+				await self.add(keys)
+		return np.stack([self._vectors_by_key[key] for key in keys])
+
+	def search_vector(self, vector: np.ndarray, k: int, minimum_similarity: float = -1.0) -> list[tuple[str, float]]:
+		"""
+		:return: up to k (key, cosine similarity) tuples, most similar first
+		"""
+		if self._index is None or not self._ids_by_key or k <= 0:
+			return []
+		similarities, ids = self._index.search(self.normalize(vector).reshape(1, -1), min(k, len(self._ids_by_key)))
+		return [(self._keys_by_id[int(faiss_id)], float(similarity))
+		        for similarity, faiss_id in zip(similarities[0], ids[0])
+		        if faiss_id != -1 and similarity >= minimum_similarity]
+
+	async def search(self, text: str, k: int, minimum_similarity: float = -1.0, transient: bool = False) -> list[tuple[str, float]]:
+		vector = (await (self.embed_transient if transient else self.embed)([text]))[0]
+		return self.search_vector(vector, k = k, minimum_similarity = minimum_similarity)
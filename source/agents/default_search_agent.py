@@ -1,22 +1,47 @@
 # Python 3.12
 from __future__ import annotations
 
+import asyncio
+import re
+import time
 import traceback
+from contextlib import aclosing
 from typing import Any, TYPE_CHECKING
 
 from langchain_core.exceptions import OutputParserException
-from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.tools import Tool
 from langgraph.prebuilt import create_react_agent
 
 from source.agentic_tasks.agent_task_wrapper import AgenticTaskWrapper, AgentTaskResult
+from source.agentic_tasks.prompt_templates import (
+    AGENTIC_CONTEXT_PROMPT,
+    AGENTIC_CONTEXT_PROMPT_NATIVE,
+    AGENTIC_CONTEXT_QUICK_ACCESS_SECTION,
+    QUICK_RESULT_PROMPT,
+    QUICK_RESULT_PROMPT_NATIVE,
+    QUICK_RESULT_QUICK_ACCESS_SECTION,
+    REACT_AGENT_SYSTEM_PROMPT,
+    REACT_AGENT_SYSTEM_PROMPT_NATIVE,
+    agent_task_result_output_parser,
+)
+from source.agentic_tasks.hedged_execution import HedgingStatistics
+from source.agentic_tasks.quick_access_context import QuickAccessContext
 from source.agentic_tasks.task_status import TaskStatus
 from source.agents.tools.local_files_rag_tool import LocalFilesRAGTool # unused here but kept if you plan to use later
+from source.chat.topic_segmenter import TopicSegmenter
 if TYPE_CHECKING:
+    from source.agentic_tasks.agents_config import AgentsConfig
     from source.chat.message import Message
 from source.dev_logger import debug, measure_time
 from source.global_instances.agents_config import global_agents_config
 from source.global_models import cached_embeddings, default_cheapest_model
 from source.locations_and_config import uploads_dir, path_quick_access_info
+from source.llm_usage import LlmUsage
+from source.prompt_caching import prepare_cached_prompt
+from source.structured_output import OutputMode, StructuredOutputStatistics, ainvoke_structured
+
+
+_EMPTY_JSON_ANSWER = re.compile(r"<json>\s*</json>")
 
 
 class DefaultAgent:
@@ -27,9 +52,18 @@ class DefaultAgent:
         embeddings=cached_embeddings,
         allow_unsafe_deser=True,
     )
+    # compiled ReAct graphs by (model, native output mode); they hold no per-run state, so all runs share them
+    _react_agents: dict[tuple[int, bool], Any] = {}
+    _rag_tool: Tool | None = None
 
-    def __init__(self) -> None:
+    def __init__(self, config: AgentsConfig | None = None) -> None:
         self.category_query_llm = default_cheapest_model
+        # the config of the task's session; the process-wide config if the agent is used on its own
+        self.config: AgentsConfig = config or global_agents_config
+        # per instance (one DefaultAgent per factory, i.e. per session), so every session reports its own
+        self.output_statistics: StructuredOutputStatistics = StructuredOutputStatistics()
+        self.llm_usage: LlmUsage = LlmUsage()  # quick path, tagged json
+        self.hedging_statistics: HedgingStatistics = HedgingStatistics()
 
     # -----------------------------
     # Helpers
@@ -68,42 +102,74 @@ class DefaultAgent:
         debug(f"QUICK RESULT AVAILABLE: {result.content if hasattr(result, 'content') else 'No content'}")
         return False
 
-    def _build_context_prompt(
+    async def _task_chat_context(
         self, agentic_task_wrapper: AgenticTaskWrapper, messages: Message
+    ) -> str:
+        """Chat context for the task: topic segments relevant to the task, or summary + recent chat."""
+        if self.config.topic_scoped_task_context:
+            segmenter = TopicSegmenter.for_conversation(messages.conversation_id)
+            return await segmenter.get_chat_context_for_task(
+                messages,
+                query_or_task=agentic_task_wrapper.query_or_task,
+                config=self.config.summarization_config,
+                maximum_number_of_segments=self.config.topic_segments_per_task,
+            )
+        return messages.get_chat_context(
+            minimum_number_of_messages=50,
+            config=self.config.summarization_config,
+        )
+
+    async def _quick_access_info(self, agentic_task_wrapper: AgenticTaskWrapper) -> str:
+        """The passages of the quick access file relevant to the task (cached, re-read only when the file changes)."""
+        quick_access_context = QuickAccessContext.for_path(path_quick_access_info, self.config.quick_access_context)
+        return await quick_access_context.get_context(agentic_task_wrapper.query_or_task, self.config.quick_access_context)
+
+    async def _build_context_prompt(
+        self, agentic_task_wrapper: AgenticTaskWrapper, messages: Message, native: bool = False
     ) -> str:
         """Compose a compact prompt with prior chat + quick access + task."""
         messages = self._last_message(messages)
 
-        parser = PydanticOutputParser(pydantic_object=AgentTaskResult)
-        prompt = "You are a careful, precise assistant.\n"
-        prompt += "When you cite local files, use bracketed numeric citations like [1], [2].\n"
-        prompt += "If you use tools, incorporate their outputs faithfully.\n\n"
-
-        # Prior chat context
-        prompt += "Context from previous chat:\n"
-        prompt += "<chat>\n"
-        prompt += messages.get_chat_context(
-            minimum_number_of_messages=50,
-            config=global_agents_config.summarization_config,
+        quick_access_section = ""
+        quick_access_info = await self._quick_access_info(agentic_task_wrapper)
+        if quick_access_info:
+            quick_access_section = AGENTIC_CONTEXT_QUICK_ACCESS_SECTION.render(
+                quick_access_info=quick_access_info
+            )
+        return (AGENTIC_CONTEXT_PROMPT_NATIVE if native else AGENTIC_CONTEXT_PROMPT).render(
+            chat=await self._task_chat_context(agentic_task_wrapper, messages),
+            quick_access_section=quick_access_section,
+            query_or_task=agentic_task_wrapper.query_or_task,
         )
-        prompt += "\n</chat>\n\n"
 
-        # Quick access info (if present)
-        if path_quick_access_info.exists():
-            prompt += "Context from quick access info:\n"
-            prompt += "<quick_access_info>\n"
-            prompt += path_quick_access_info.read_text()
-            prompt += "\n</quick_access_info>\n\n"
+    @classmethod
+    def get_rag_tool(cls) -> Tool:
+        if cls._rag_tool is None:
+            cls._rag_tool = cls.local_files_rag_tool.as_tool()
+        return cls._rag_tool
 
-        # Current task
-        prompt += "Current task:\n"
-        prompt += f"<query_or_task>{agentic_task_wrapper.query_or_task}</query_or_task>\n\n"
-
-        # Output contract
-        prompt += "Put your final answer inside <json>...</json> tags.\n"
-        prompt += "Your answer must satisfy the following Pydantic schema:\n"
-        prompt += parser.get_format_instructions() + "\n"
-        return prompt
+    def get_react_agent(self, native: bool) -> Any:
+        """The ReAct agent over category_query_llm with the local-files RAG tool, compiled on first use."""
+        key = (id(self.category_query_llm), native)
+        agent = self._react_agents.get(key)
+        if agent is not None:
+            return agent
+        if native:
+            # the graph ends with a structured output call that fills agent_result["structured_response"]
+            agent = create_react_agent(
+                model=self.category_query_llm,
+                tools=[self.get_rag_tool()],
+                prompt=REACT_AGENT_SYSTEM_PROMPT_NATIVE,
+                response_format=AgentTaskResult,
+            )
+        else:
+            agent = create_react_agent(
+                model=self.category_query_llm,
+                tools=[self.get_rag_tool()],
+                prompt=REACT_AGENT_SYSTEM_PROMPT,
+            )
+        self._react_agents[key] = agent
+        return agent
 
     # -----------------------------
     # Fast path (your original)
@@ -112,72 +178,92 @@ class DefaultAgent:
         self, agentic_task_wrapper: AgenticTaskWrapper, messages: Message
     ) -> AgentTaskResult|None:
         messages = self._last_message(messages)
-        parser = PydanticOutputParser(pydantic_object=AgentTaskResult)
+        parser = agent_task_result_output_parser
 
-        prompt = "You are a concise assistant.\n"
-        prompt += "If you can answer without external lookup, do so.\n"
-        prompt += "If you need to look up info, return an empty JSON object.\n\n"
+        quick_access_section = ""
+        quick_access_info = await self._quick_access_info(agentic_task_wrapper)
+        if quick_access_info:
+            quick_access_section = QUICK_RESULT_QUICK_ACCESS_SECTION.render(
+                quick_access_info=quick_access_info
+            )
+        native = self.config.agent_output_mode == OutputMode.native
+        prompt = (QUICK_RESULT_PROMPT_NATIVE if native else QUICK_RESULT_PROMPT).render(
+            chat=await self._task_chat_context(agentic_task_wrapper, messages),
+            quick_access_section=quick_access_section,
+            query_or_task=agentic_task_wrapper.query_or_task,
+        )
 
-        prompt += "Context from previous chat:\n"
-        prompt += "<chat>"
-        prompt += messages.get_chat_context(
-            minimum_number_of_messages=50,
-            config=global_agents_config.summarization_config,
+        if native:
+            parsed, _, parsing_error = await ainvoke_structured(
+                self.category_query_llm, prompt, AgentTaskResult
+            )
+            self.output_statistics.record(OutputMode.native, parsed=parsing_error is None)
+            # a parse failure or more_info_needed escalates to the agentic path
+            if parsing_error is not None or parsed.more_info_needed:
+                return None
+            await agentic_task_wrapper.set_result(parsed)
+            return parsed
+
+        start = time.perf_counter()
+        text, invoke_kwargs = await prepare_cached_prompt(
+            self.category_query_llm, prompt, QUICK_RESULT_PROMPT.static_prefix, self.config.prompt_caching
         )
-        prompt += "</chat>\n"
-
-        if path_quick_access_info.exists():
-            prompt += "Context from quick access info:\n"
-            prompt += "<quick_access_info>"
-            prompt += path_quick_access_info.read_text()
-            prompt += "</quick_access_info>\n"
-
-        prompt += "Context from current task:\n"
-        prompt += f"You're given the following query or task: <query_or_task>{agentic_task_wrapper.query_or_task}</query_or_task>.\n"
-        prompt += "Put your answer in <json>...</json> tags.\n"
-        prompt += "If you think you need to look something up, answer with empty <json></json>.\n"
-        prompt += "Your answer must match this schema:\n"
-        prompt += parser.get_format_instructions() + "\n"
-
-        result = await self.category_query_llm.ainvoke(prompt)
+        hedged_execution = self.config.hedged_execution
+        if hedged_execution.enabled and hedged_execution.detect_empty_answer_early:
+            content, result = await self._stream_quick_answer(text, invoke_kwargs)
+            self.llm_usage.record(result, time.perf_counter() - start)
+            if content is None:
+                self.hedging_statistics.number_of_early_escalations += 1
+                self.output_statistics.record(OutputMode.tagged_json, parsed=True)
+                return None
+        else:
+            result = await self.category_query_llm.ainvoke(text, **invoke_kwargs)
+            self.llm_usage.record(result, time.perf_counter() - start)
+            content = result.content
         try:
-            content: str = result.content.strip()
+            content: str = content.strip()
             json_str = content.split("<json>")[-1].split("</json>")[0].strip()
             if len(json_str.strip()) == 0:
+                self.output_statistics.record(OutputMode.tagged_json, parsed=True)
                 return None
             parsed = parser.parse(json_str)
         except OutputParserException as e:
+            self.output_statistics.record(OutputMode.tagged_json, parsed=False)
             return None
+        self.output_statistics.record(OutputMode.tagged_json, parsed=True)
         await agentic_task_wrapper.set_result(parsed)
         return parsed
 
+    async def _stream_quick_answer(self, text: str, invoke_kwargs: dict[str, Any]) -> tuple[str | None, Any]:
+        """
+        :return: (answer, aggregated chunks for usage accounting); the answer is None as soon as the
+            stream shows an empty <json></json>, the rest of the answer is not awaited
+        """
+        content = ""
+        aggregated_chunks = None
+        async with aclosing(self.category_query_llm.astream(text, **invoke_kwargs)) as stream:
+            async for chunk in stream:
+                aggregated_chunks = chunk if aggregated_chunks is None else aggregated_chunks + chunk
+                content += chunk.content if isinstance(chunk.content, str) else "".join(
+                    part if isinstance(part, str) else part.get("text", "") for part in chunk.content)
+                if _EMPTY_JSON_ANSWER.search(content):
+                    return None, aggregated_chunks
+        return content, aggregated_chunks
+
     # -----------------------------
     # Agentic path (more precise, allowed to use tools)
     # -----------------------------
     async def agentic_result(
         self, agentic_task_wrapper: AgenticTaskWrapper, messages: Message
     ) -> AgentTaskResult:
-        parser = PydanticOutputParser(pydantic_object=AgentTaskResult)
-
-        # Bind the local-files RAG as a tool
-        rag_tool = self.local_files_rag_tool.as_tool()
-
-        # Build a ReAct agent over your cheapest model
-        agent = create_react_agent(
-            model=self.category_query_llm,
-            tools=[rag_tool],
-            prompt=(
-                "You are a precise ReAct agent.\n"
-                "Use tools when they can materially improve accuracy.\n"
-                "Prefer the LocalFilesRAG tool for any query that might be answered from local documents. "
-                "But of course you may also answer yourself in case the tools don't provide answers and you are pretty sure."
-                "When you produce the final answer, it MUST be enclosed in <json>...</json> and conform to the provided schema.\n"
-                "Include bracketed citations like [1], [2] when drawing on local files."
-            ),
-        )
+        parser = agent_task_result_output_parser
+
+        # ReAct agent over your cheapest model with the local-files RAG as a tool
+        native = self.config.agent_output_mode == OutputMode.native
+        agent = self.get_react_agent(native)
 
         # Compose the user-facing prompt that includes schema instructions
-        user_prompt = self._build_context_prompt(agentic_task_wrapper, messages)
+        user_prompt = await self._build_context_prompt(agentic_task_wrapper, messages, native=native)
 
         # Run the agent (it will think/act/call tools as needed)
         agent_result: dict[str, Any] = await agent.ainvoke(
@@ -190,11 +276,19 @@ class DefaultAgent:
         ) else str(agent_result)
 
         # Parse to your schema
+        mode = OutputMode.native if native else OutputMode.tagged_json
         try:
-            json_str = final_text.split("<json>")[-1].split("</json>")[0].strip()
-            parsed = parser.parse(json_str)
+            if native:
+                parsed = agent_result["structured_response"]
+                if not isinstance(parsed, AgentTaskResult):
+                    raise ValueError("No AgentTaskResult in the structured response of the agent.")
+            else:
+                json_str = final_text.split("<json>")[-1].split("</json>")[0].strip()
+                parsed = parser.parse(json_str)
+            self.output_statistics.record(mode, parsed=True)
             await agentic_task_wrapper.set_result(parsed)
         except Exception as e:
+            self.output_statistics.record(mode, parsed=False)
             # Fall back to a minimal error result if parsing fails
             
             debug(f"Agent parsing failed: {e}\n{final_text}")
@@ -212,6 +306,8 @@ class DefaultAgent:
     # Entry point
     # -----------------------------
     async def run(self, agentic_task_wrapper: AgenticTaskWrapper) -> AgentTaskResult:
+        if self.config.hedged_execution.enabled:
+            return await self._run_hedged(agentic_task_wrapper)
         try:
             quick = await self.quick_result(
                 agentic_task_wrapper, agentic_task_wrapper.message
@@ -232,3 +328,62 @@ class DefaultAgent:
             return await self.agentic_result(
                 agentic_task_wrapper, agentic_task_wrapper.message
             )
+
+    def _quick_outcome(self, quick_task: asyncio.Task, agentic_task_wrapper: AgenticTaskWrapper) -> AgentTaskResult | None:
+        """Result of a finished quick path, None if it failed or needs the agentic path."""
+        try:
+            quick = quick_task.result()
+        except Exception as e:
+            debug(f"Quick path failed for task {agentic_task_wrapper.query_or_task}: {e}; falling back to agent.")
+            return None
+        if quick is None or self._needs_agent(quick):
+            return None
+        return quick
+
+    async def _run_hedged(self, agentic_task_wrapper: AgenticTaskWrapper) -> AgentTaskResult:
+        """
+        Start the quick path; if it has not answered within quick_path_deadline_sec, start the agentic
+        path in parallel. The first valid result wins and the other path is cancelled. An empty or
+        failed quick answer escalates to the agentic path right away (early, when streamed).
+        """
+        statistics = self.hedging_statistics
+        statistics.number_of_runs += 1
+        message = agentic_task_wrapper.message
+        quick_task = asyncio.create_task(self.quick_result(agentic_task_wrapper, message))
+        agentic_task: asyncio.Task | None = None
+        try:
+            done, _ = await asyncio.wait({quick_task}, timeout=self.config.hedged_execution.quick_path_deadline_sec)
+            if not done:
+                debug(f"Quick path of task {agentic_task_wrapper.query_or_task} missed its deadline, starting the agentic path in parallel.")
+                statistics.number_of_hedged_runs += 1
+                agentic_task = asyncio.create_task(self.agentic_result(agentic_task_wrapper, message))
+                done, _ = await asyncio.wait({quick_task, agentic_task}, return_when=asyncio.FIRST_COMPLETED)
+                if agentic_task in done and agentic_task.exception() is None and agentic_task.result().group != "error":
+                    statistics.number_of_agentic_wins += 1
+                    return agentic_task.result()
+                await asyncio.wait({quick_task})
+            quick = self._quick_outcome(quick_task, agentic_task_wrapper)
+            if quick is not None:
+                statistics.number_of_quick_wins += 1
+                if agentic_task is not None and agentic_task.done() and agentic_task_wrapper.result is not quick:
+                    # the agentic path finished first with an error result, the valid quick answer replaces it
+                    await agentic_task_wrapper.set_result(quick)
+                return quick
+            debug("Escalating to agentic path (needs lookup or empty result).")
+            if agentic_task is None:
+                agentic_task = asyncio.create_task(self.agentic_result(agentic_task_wrapper, message))
+            try:
+                agentic = await agentic_task
+            except Exception:
+                statistics.number_of_agentic_errors += 1
+                raise
+            if agentic.group == "error":
+                statistics.number_of_agentic_errors += 1
+            else:
+                statistics.number_of_agentic_wins += 1
+            return agentic
+        finally:
+            # the losing path must neither keep spending tokens nor overwrite the result
+            for path_task in (quick_task, agentic_task):
+                if path_task is not None and not path_task.done():
+                    path_task.cancel()
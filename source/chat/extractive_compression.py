@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from source.dev_logger import debug
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_TOKEN = re.compile(r"[\w']+")
+
+FILLER_WORDS: frozenset[str] = frozenset({
+	"uh", "uhm", "um", "umm", "er", "erm", "hmm", "mhm", "mm", "ah", "huh",
+})
+FILLER_PHRASES: frozenset[str] = frozenset({"you know", "i mean"})
+# filler only when the whole sentence is made of them: "Okay." says nothing, "Right, Friday then." does
+ACKNOWLEDGEMENT_WORDS: frozenset[str] = frozenset({
+	"yeah", "yea", "yep", "yes", "ok", "okay", "sure", "alright", "right", "cool", "oh", "well", "so", "thanks",
+})
+_FILLER_PHRASE = re.compile(r"(?<= )(?:" + "|".join(re.escape(phrase) for phrase in FILLER_PHRASES) + r")(?= )")
+
+
+@dataclass
+class CompressionStatistics:
+	number_of_calls: int = 0
+	words_in: int = 0
+	words_out: int = 0
+	seconds: float = 0.0
+
+	@property
+	def ratio(self) -> float:
+		return self.words_out / self.words_in if self.words_in else 1.0
+
+
+@dataclass
+class ExtractiveCompressor:
+	"""
+	Cheap local pre-compression of chat lines before they are sent to an LLM.
+
+	- sentences consisting only of disfluencies and acknowledgements ("um", "you know", "yeah", "okay", ...) are dropped
+	- near duplicate sentences (tf-idf cosine similarity above duplicate_threshold) are dropped
+	- the remaining sentences are ranked by similarity to the tf-idf centroid of the chat and their
+	  mean idf, and picked by maximal marginal relevance until target_ratio of the words is reached
+	- picked sentences are returned in their original order
+	"""
+	target_ratio: float = 0.5
+	duplicate_threshold: float = 0.85
+	redundancy_penalty: float = 0.5
+	minimum_number_of_words: int = 80
+	statistics: CompressionStatistics = field(default_factory = CompressionStatistics)
+
+	@staticmethod
+	def _tokenize(text: str) -> list[str]:
+		return _TOKEN.findall(text.lower())
+
+	@staticmethod
+	def _is_filler_only(tokens: list[str]) -> bool:
+		without_phrases = _FILLER_PHRASE.sub(" ", f" {' '.join(tokens)} ")
+		return all(token in FILLER_WORDS or token in ACKNOWLEDGEMENT_WORDS for token in without_phrases.split())
+
+	@staticmethod
+	def _tf_idf_matrix(tokenized: list[list[str]]) -> tuple[np.ndarray, np.ndarray]:
+		"""
+		:return: l2 normalized tf-idf rows and the mean idf per sentence (how specific a sentence is)
+		"""
+		vocabulary: dict[str, int] = {}
+		rows: list[int] = []
+		columns: list[int] = []
+		for row, tokens in enumerate(tokenized):
+			for token in tokens:
+				rows.append(row)
+				columns.append(vocabulary.setdefault(token, len(vocabulary)))
+		counts = np.zeros((len(tokenized), max(len(vocabulary), 1)), dtype = np.float32)
+		np.add.at(counts, (np.asarray(rows, dtype = np.intp), np.asarray(columns, dtype = np.intp)), 1.0)
+		document_frequency = np.count_nonzero(counts, axis = 0)
+		idf = np.log((1.0 + len(tokenized)) / (1.0 + document_frequency)) + 1.0
+		tf_idf = counts * idf
+		norms = np.linalg.norm(tf_idf, axis = 1, keepdims = True)
+		mean_idf = tf_idf.sum(axis = 1) / np.maximum(counts.sum(axis = 1), 1.0)
+		return tf_idf / np.maximum(norms, 1e-12), mean_idf
+
+	def compress_lines(self, lines: list[tuple[str, str]]) -> str:
+		"""
+		:param lines: (sender, text) tuples in chat order
+		:return: the compressed chat in the "sender: text" format used for the prompts
+		"""
+		uncompressed = "\n".join(f"{sender}: {text}" for sender, text in lines)
+		words_in = sum(len(text.split()) for _, text in lines)
+		if words_in < self.minimum_number_of_words:
+			return uncompressed
+		start = time.perf_counter()
+
+		sentences: list[tuple[int, str]] = []
+		for line_index, (_, text) in enumerate(lines):
+			for sentence in _SENTENCE_SPLIT.split(text.strip()):
+				if sentence:
+					sentences.append((line_index, sentence))
+		tokenized = [self._tokenize(sentence) for _, sentence in sentences]
+		informative = np.array([not self._is_filler_only(tokens) for tokens in tokenized], dtype = bool)
+		if not informative.any():
+			return uncompressed
+
+		tf_idf, mean_idf = self._tf_idf_matrix(tokenized)
+		similarity = tf_idf @ tf_idf.T
+		# a sentence is a duplicate if an earlier informative sentence is too similar to it
+		earlier = np.tril(similarity, k = -1) * informative[np.newaxis, :]
+		duplicate = (earlier > self.duplicate_threshold).any(axis = 1)
+		candidates = informative & ~duplicate
+
+		centroid = tf_idf[candidates].sum(axis = 0)
+		centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+		# topical sentences and sentences with rare terms (numbers, names, ...) are both worth keeping
+		specificity = mean_idf / max(float(mean_idf.max()), 1e-12)
+		relevance = np.where(candidates, 0.5 * (tf_idf @ centroid) + 0.5 * specificity, -np.inf)
+
+		# maximal marginal relevance: prefer sentences that add something the kept ones do not cover yet
+		lengths = np.array([len(sentence.split()) for _, sentence in sentences])
+		budget = max(1, int(words_in * self.target_ratio))
+		redundancy = np.zeros(len(sentences), dtype = np.float32)
+		available = candidates.copy()
+		selected: list[int] = []
+		used_words = 0
+		while available.any():
+			marginal = np.where(available, relevance - self.redundancy_penalty * redundancy, -np.inf)
+			best = int(np.argmax(marginal))
+			available[best] = False
+			if selected and used_words + lengths[best] > budget:
+				continue
+			selected.append(best)
+			used_words += int(lengths[best])
+			redundancy = np.maximum(redundancy, similarity[best])
+		kept = sorted(selected)
+
+		kept_by_line: dict[int, list[str]] = {}
+		for sentence_index in kept:
+			line_index, sentence = sentences[sentence_index]
+			kept_by_line.setdefault(line_index, []).append(sentence)
+		compressed = "\n".join(f"{lines[line_index][0]}: {' '.join(kept_sentences)}" for line_index, kept_sentences in kept_by_line.items())
+
+		words_out = used_words
+		seconds = time.perf_counter() - start
+		self.statistics.number_of_calls += 1
+		self.statistics.words_in += words_in
+		self.statistics.words_out += words_out
+		self.statistics.seconds += seconds
+		debug(f"Pre-compressed chat from {words_in} to {words_out} words in {seconds * 1000:.1f} ms.")
+		return compressed
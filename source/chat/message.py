@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import asyncio
+import uuid
 from datetime import datetime, timezone, timedelta
 from typing import Optional, List, Callable, TYPE_CHECKING
 
@@ -17,6 +18,8 @@ from source.chat.word import Word, AudioStream
 async_global_messages_change_lock: asyncio.Lock = asyncio.Lock()
 
 class Message(BaseModel):
+	message_id: str = Field(default_factory = lambda: uuid.uuid4().hex,
+	                        description = "Stable id of the message, kept when other messages are absorbed into it.")
 	time_start: datetime
 	time_end: Optional[datetime] = None
 	conversation_id: str
@@ -130,6 +133,15 @@ class Message(BaseModel):
 		while current.next_message:
 			current = current.next_message
 		return current
+	
+	def get_recent_chat_window(self, number_of_messages: int) -> str:
+		"""The last number_of_messages messages of the conversation as "sender: content" lines, oldest first."""
+		recent_messages = []
+		current = self.get_most_recent_message()
+		while current is not None and len(recent_messages) < number_of_messages:
+			recent_messages.append(current)
+			current = current.previous_message
+		return "\n".join(f"{msg.sender}: {msg.content}" for msg in reversed(recent_messages))
 		
 	async def absorb_other_into_messages_stream(self, other: Message, time_distance_to_never_fusion_messages_sec: float = 5, timestamp_of_change: Optional[datetime] = None) -> None:
 		async with async_global_messages_change_lock:
@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 import asyncio
+import re
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
 from hashlib import md5
@@ -9,12 +11,16 @@ from typing import Optional, List, Set, Any
 
 from assemblyai.streaming.v3 import TurnEvent
 from langchain.output_parsers import PydanticOutputParser
+from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from source.chat.extractive_compression import ExtractiveCompressor, CompressionStatistics
 from source.chat.message import Message
 from source.dev_logger import debug
-from source.global_models import default_thinking_model
+from source.global_models import default_thinking_model, summarization_instructions_store, get_model_name
+from source.single_flight import SingleFlight
+from source.structured_output import OutputMode, StructuredOutputStatistics, ainvoke_structured
 
 
 
@@ -31,14 +37,36 @@ class SummaryOfPreviousChatConfig(BaseModel):
 		default =  None,
 		description="Prompt to guide the summarization of previous chat messages."
 	)
+	pre_compression_ratio: Optional[float] = Field(
+		default = None, gt = 0.0, le = 1.0,
+		description="If set, the new chat messages are compressed locally (filler and near duplicate removal, tf-idf sentence selection) to roughly this fraction of their words before they are sent to the LLM."
+	)
+	output_mode: OutputMode = Field(
+		default = OutputMode.tagged_json,
+		description="tagged_json: the summary is read from <summary_of_previous_chat> tags. native: the summary is returned through the provider's structured output."
+	)
 	
 	def config_id(self) -> str:
-		return f"summary_{self.max_length_words}_{md5(self.user_intent.encode()).hexdigest()}"
+		compression = f"_compressed_{self.pre_compression_ratio}" if self.pre_compression_ratio is not None else ""
+		return f"summary_{self.max_length_words}_{md5(self.user_intent.encode()).hexdigest()}{compression}"
 		# return f"summary_of_previous_chat_{self.max_length_words}_{self.user_intent}"
 	
+	def instructions_cache_key(self, llm: BaseChatModel) -> str:
+		"""
+		Key of the generated summarization instructions in the on disk store.
+		The key only contains characters the LocalFileStore accepts.
+		"""
+		return f"{self.config_id()}_{re.sub(r'[^a-zA-Z0-9_.-]', '_', get_model_name(llm))}"
+	
 	async def get_summarization_instructions(self)->str:
 		if self.prompt is not None:
 			return self.prompt
+		cache_key = self.instructions_cache_key(default_thinking_model)
+		cached_instructions = (await summarization_instructions_store.amget([cache_key]))[0]
+		if cached_instructions:
+			self.prompt = cached_instructions.decode("utf-8")
+			return self.prompt
+		
 		prompt = ""
 		prompt += "a user has instructions for an AI assistant to provide him/her with live assistance during a chat.\n"
 		prompt += f"the user has the following instructions for the AI assistant <user_intent>{self.user_intent}</user_intent>\n"
@@ -48,12 +76,26 @@ class SummaryOfPreviousChatConfig(BaseModel):
 		result = await default_thinking_model.ainvoke(prompt)
 		instructions = result.content.split("<summarization instructions>")[-1].split("</summarization instructions>")[0].strip()
 		
+		if instructions:
+			await summarization_instructions_store.amset([(cache_key, instructions.encode("utf-8"))])
 		self.prompt = instructions
 		return instructions
 		
 
 
+class SummaryOfPreviousChatOutput(BaseModel):
+	summary: Optional[str] = Field(
+		default = None,
+		description="The updated summary of the chat, or null in case the new chat messages hold no information worth being summarized."
+	)
+
+
 class SummaryOfPreviousChat:
+	# concurrent create() calls for the same message and config share one LLM call
+	single_flight: SingleFlight = SingleFlight(name = "summary_of_previous_chat")
+	pre_compression_statistics: CompressionStatistics = CompressionStatistics()
+	output_statistics: StructuredOutputStatistics = StructuredOutputStatistics()
+	
 	def __init__(self, summary: str, config: SummaryOfPreviousChatConfig):
 		self.summary: str = summary
 		self.config: SummaryOfPreviousChatConfig = config
@@ -61,13 +103,28 @@ class SummaryOfPreviousChat:
 	
 	@classmethod
 	async def create(cls, message_to_fill: Message, config: SummaryOfPreviousChatConfig  ) -> SummaryOfPreviousChat |  None:
-		if summary:= message_to_fill.get_summary(config = config) is not None:
+		if (summary := message_to_fill.get_summary(config = config)) is not None:
 			return summary
+		return await cls.single_flight.run(
+			key = (message_to_fill.message_id, config.config_id()),
+			coroutine_factory = lambda: cls._create(message_to_fill = message_to_fill, config = config),
+		)
+	
+	@classmethod
+	def get_single_flight_statistics(cls) -> dict[str, int]:
+		return cls.single_flight.statistics()
+	
+	@classmethod
+	async def _create(cls, message_to_fill: Message, config: SummaryOfPreviousChatConfig) -> SummaryOfPreviousChat | None:
 		previous_summary_instance, messages_without_summary = message_to_fill.get_summary_and_chat(config = config)
 		
-		not_summarized_chat = "\n".join(
-			f"{msg.sender}: {msg.content_as_string}" for msg in messages_without_summary
-		)
+		if config.pre_compression_ratio is not None:
+			compressor = ExtractiveCompressor(target_ratio = config.pre_compression_ratio, statistics = cls.pre_compression_statistics)
+			not_summarized_chat = compressor.compress_lines([(msg.sender, msg.content_as_string) for msg in messages_without_summary])
+		else:
+			not_summarized_chat = "\n".join(
+				f"{msg.sender}: {msg.content_as_string}" for msg in messages_without_summary
+			)
 		
 		if previous_summary_instance is not None:
 			previous_summary = previous_summary_instance.summary
@@ -81,16 +138,32 @@ class SummaryOfPreviousChat:
 		
 		prompt += (f" the summarization you create should at maximum the {config.max_length_words} words long."
 		           f" keep as much information from the old summary as possible and update it to contain the information from the new chat messages. further more adhere also to the following instructions:\n"
-		           f"<further summarization instructions>{await config.get_summarization_instructions()}</further summarization instructions>\n"
-		           f" put your final summary into <summary_of_previous_chat></summary_of_previous_chat> tags. in case you do not think there is information worth being summarized in the new chat messages,"
-		           f" just return <summary_of_previous_chat>None</summary_of_previous_chat>\n")
-			
-		llm_result = await default_thinking_model.ainvoke(prompt)
-		content = llm_result.content
-		summary = content.split("<summary_of_previous_chat>")[-1].split("</summary_of_previous_chat>")[0].strip()
+		           f"<further summarization instructions>{await config.get_summarization_instructions()}</further summarization instructions>\n")
+		
+		summary = None
+		if config.output_mode == OutputMode.native:
+			start = time.perf_counter()
+			parsed, _, parsing_error = await ainvoke_structured(default_thinking_model, prompt, SummaryOfPreviousChatOutput)
+			debug(f"Summarization of {len(prompt.split())} prompt words took {time.perf_counter() - start:.2f} sec.")
+			cls.output_statistics.record(OutputMode.native, parsed = parsing_error is None)
+			if parsing_error is None:
+				summary = (parsed.summary or "none").strip()
+			else:
+				debug(f"Native structured summarization failed, retrying with tags: {parsing_error}")
+		
+		if summary is None:
+			prompt += (f" put your final summary into <summary_of_previous_chat></summary_of_previous_chat> tags. in case you do not think there is information worth being summarized in the new chat messages,"
+			           f" just return <summary_of_previous_chat>None</summary_of_previous_chat>\n")
+			start = time.perf_counter()
+			llm_result = await default_thinking_model.ainvoke(prompt)
+			debug(f"Summarization of {len(prompt.split())} prompt words took {time.perf_counter() - start:.2f} sec.")
+			content = llm_result.content
+			cls.output_statistics.record(OutputMode.tagged_json, parsed = "<summary_of_previous_chat>" in content)
+			summary = content.split("<summary_of_previous_chat>")[-1].split("</summary_of_previous_chat>")[0].strip()
 		if summary.lower() != "none" or len(summary.strip()) > 20:
 			summary_instance = SummaryOfPreviousChat(summary=summary, config=config)
 			await message_to_fill.set_summary(summary=summary_instance, timestamp=datetime.now(timezone.utc))
+			return summary_instance
 		else:
 			return None
 
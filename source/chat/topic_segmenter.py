@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from source.chat.message import Message
+from source.chat.summary_of_previous_chat import SummaryOfPreviousChatConfig
+from source.dev_logger import debug
+from source.global_models import base_embeddings, cached_embeddings
+
+
+@dataclass
+class TopicSegment:
+	start: int  # index of the first message (inclusive)
+	end: int  # index of the last message (exclusive)
+	centroid: np.ndarray
+
+
+class TopicSegmenter:
+	"""
+	Splits a conversation into topic segments based on embedding similarity change points.
+
+	Every message is embedded once (keyed by message_id and content, so a message that absorbed
+	more words is re-embedded). For every gap between two messages the mean embeddings of the
+	`window_size` messages before and after the gap are compared; gaps whose similarity is a local
+	minimum and clearly below the average similarity of the conversation become segment boundaries.
+	Messages are embedded without the embedding cache (they change while words are absorbed, and
+	are kept here anyway); only the task queries go through query_embeddings (cached).
+	"""
+	_segmenters_by_conversation: dict[str, TopicSegmenter] = {}
+
+	def __init__(self, embeddings: Embeddings = base_embeddings, query_embeddings: Embeddings = cached_embeddings,
+	             window_size: int = 3, boundary_std_factor: float = 0.5, minimum_segment_length: int = 2):
+		self.embeddings: Embeddings = embeddings
+		self.query_embeddings: Embeddings = query_embeddings
+		self.window_size: int = window_size
+		self.boundary_std_factor: float = boundary_std_factor
+		self.minimum_segment_length: int = minimum_segment_length
+		self._embedded_messages: dict[str, tuple[str, datetime, np.ndarray]] = {}  # message_id -> (content, time_start, vector)
+		self._lock: asyncio.Lock = asyncio.Lock()
+
+	@classmethod
+	def for_conversation(cls, conversation_id: str) -> TopicSegmenter:
+		if conversation_id not in cls._segmenters_by_conversation:
+			cls._segmenters_by_conversation[conversation_id] = TopicSegmenter()
+		return cls._segmenters_by_conversation[conversation_id]
+
+	@classmethod
+	def forget_conversation(cls, conversation_id: str) -> None:
+		cls._segmenters_by_conversation.pop(conversation_id, None)
+
+	@staticmethod
+	def _normalize(vectors: np.ndarray) -> np.ndarray:
+		return vectors / np.maximum(np.linalg.norm(vectors, axis = -1, keepdims = True), 1e-12)
+
+	async def _embed_messages(self, messages: list[Message], forget_before: datetime | None = None) -> np.ndarray:
+		"""
+		:param forget_before: drop the embeddings of messages that started before this time (== before the last
+			summary, they are never segmented again); done under the lock, as other runs share the segmenter
+		"""
+		async with self._lock:
+			embedded_messages = self._embedded_messages
+			if forget_before is not None:
+				embedded_messages = {message_id: entry for message_id, entry in embedded_messages.items() if entry[1] >= forget_before}
+				self._embedded_messages = embedded_messages
+			missing = [msg for msg in messages
+			           if msg.message_id not in embedded_messages or embedded_messages[msg.message_id][0] != msg.content]
+			if missing:
+				vectors = await self.embeddings.aembed_documents([f"{msg.sender}: {msg.content}" for msg in missing])
+				for msg, vector in zip(missing, vectors):
+					embedded_messages[msg.message_id] = (msg.content, msg.time_start, np.asarray(vector, dtype = np.float32))
+			return self._normalize(np.stack([embedded_messages[msg.message_id][2] for msg in messages]))
+
+	def _find_boundaries(self, vectors: np.ndarray) -> list[int]:
+		number_of_messages = len(vectors)
+		if number_of_messages < 2 * self.window_size:
+			return []
+		# window sums via cumulative sums: left window ends at the gap, right window starts at it
+		cumulative = np.concatenate([np.zeros((1, vectors.shape[1]), dtype = vectors.dtype), np.cumsum(vectors, axis = 0)])
+		gaps = np.arange(1, number_of_messages)
+		left_start = np.maximum(gaps - self.window_size, 0)
+		right_end = np.minimum(gaps + self.window_size, number_of_messages)
+		left = self._normalize(cumulative[gaps] - cumulative[left_start])
+		right = self._normalize(cumulative[right_end] - cumulative[gaps])
+		similarity = np.einsum("ij,ij->i", left, right)
+
+		padded = np.concatenate([[np.inf], similarity, [np.inf]])
+		local_minimum = (similarity <= padded[:-2]) & (similarity <= padded[2:])
+		deep_enough = similarity < similarity.mean() - self.boundary_std_factor * similarity.std()
+		boundaries: list[int] = []
+		for gap in gaps[local_minimum & deep_enough]:
+			previous = boundaries[-1] if boundaries else 0
+			if gap - previous >= self.minimum_segment_length and number_of_messages - gap >= self.minimum_segment_length:
+				boundaries.append(int(gap))
+		return boundaries
+
+	async def segment(self, messages: list[Message], forget_before: datetime | None = None) -> list[TopicSegment]:
+		if not messages:
+			return []
+		vectors = await self._embed_messages(messages, forget_before = forget_before)
+		edges = [0] + self._find_boundaries(vectors) + [len(messages)]
+		return [TopicSegment(start = start, end = end, centroid = self._normalize(vectors[start:end].mean(axis = 0)))
+		        for start, end in zip(edges[:-1], edges[1:])]
+
+	async def get_chat_context_for_task(self, message: Message, query_or_task: str, config: SummaryOfPreviousChatConfig,
+	                                    maximum_number_of_segments: int = 3) -> str:
+		"""
+		Like Message.get_chat_context, but only the topic segments most similar to the task
+		(and always the most recent segment) are included after the summary.
+		"""
+		summary, chat = message.get_summary_and_chat(config = config)
+		segments = await self.segment(chat, forget_before = chat[0].time_start if summary is not None and chat else None)
+		if len(segments) > maximum_number_of_segments:
+			query_vector = self._normalize(np.asarray(await self.query_embeddings.aembed_query(query_or_task), dtype = np.float32))
+			scores = np.stack([segment.centroid for segment in segments[:-1]]) @ query_vector
+			best = np.argsort(-scores)[:maximum_number_of_segments - 1]
+			selected = sorted([segments[int(index)] for index in best], key = lambda s: s.start) + [segments[-1]]
+			debug(f"Scoped task context to {len(selected)} of {len(segments)} topic segments.")
+		else:
+			selected = segments
+
+		prompt = f"<summary_of_previous_chat>{summary.summary if summary else 'No summary available'}</summary_of_previous_chat>\n"
+		prompt += "<chat_messages_following_summary>\n"
+		parts = []
+		previous_end = 0
+		for segment in selected:
+			if segment.start > previous_end:
+				parts.append("[...]")
+			parts.extend(f"{msg.sender}: {msg.content_as_string}" for msg in chat[segment.start:segment.end])
+			previous_end = segment.end
+		prompt += "\n".join(parts)
+		prompt += "</chat_messages_following_summary>\n"
+		return prompt
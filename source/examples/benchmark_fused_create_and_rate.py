@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from source.agentic_tasks.agent_pool import AgentPool
+from source.agentic_tasks.agent_rater import AgentRater
+from source.agentic_tasks.agentic_tasks_factory import AgenticTasksFactory
+from source.agentic_tasks.agents_config import AgentsConfig
+from source.agentic_tasks.fused_create_and_rate import FusedAgentCreatorAndRater
+from source.chat.message import Message
+from source.dev_logger import debug
+from source.global_instances.testing_insctances import conversation_json
+
+assistant_instructions = "I am tom. I am salesperson that wants to sell solar roofs to customers jerry. Please provide me with information that helps me to sell solar roofs to jerry. You may also provide tips what to ask next."
+
+
+def create_components():
+	config = AgentsConfig()
+	config.set_assistant_instructions(assistant_instructions)
+	agent_pool = AgentPool(config = config)
+	agent_tasks_factory = AgenticTasksFactory(agent_pool = agent_pool, config = config)
+	agent_rater = AgentRater(agent_pool = agent_pool, config = config)
+	return agent_tasks_factory, agent_rater, FusedAgentCreatorAndRater(agent_tasks_factory = agent_tasks_factory, agent_rater = agent_rater, config = config)
+
+
+async def benchmark(fused: bool) -> dict:
+	agent_tasks_factory, agent_rater, agent_creator_and_rater = create_components()
+	messages_list = Message.create_messages_list_from_list(messages_json = conversation_json)
+	initial_message = messages_list[0]
+	seconds = 0.0
+	for message in messages_list[1:]:
+		await initial_message.absorb_other_into_messages_stream(other = message)
+		start = time.perf_counter()
+		if fused:
+			await agent_creator_and_rater.create_and_rate(message = initial_message)
+		else:
+			await asyncio.gather(agent_tasks_factory.create_new_agents(message = initial_message),
+			                     agent_rater.rate_agents(message = initial_message))
+		seconds += time.perf_counter() - start
+		await asyncio.sleep(1)  # let some agents finish so that there is something to rate
+	if fused:
+		usage = agent_creator_and_rater.llm_usage.as_dict()
+	else:
+		creation, rating = agent_tasks_factory.llm_usage.as_dict(), agent_rater.llm_usage.as_dict()
+		usage = {key: creation[key] + rating[key] for key in ("calls", "input_tokens", "output_tokens")}
+	usage["wall_seconds_per_message"] = round(seconds / (len(messages_list) - 1), 3)
+	usage["tasks"] = len(agent_tasks_factory.agent_pool.task_embedding_index)
+	return usage
+
+
+async def main():
+	two_calls = await benchmark(fused = False)
+	fused = await benchmark(fused = True)
+	debug(f"two calls per message: {two_calls}")
+	debug(f"fused call per message: {fused}")
+
+
+if __name__ == "__main__":
+	asyncio.run(main())
@@ -0,0 +1,67 @@
+import timeit
+
+from langchain_core.output_parsers import PydanticOutputParser
+
+from source.agentic_tasks.agent_task_wrapper import AgentTaskResult, ListOfAgenticTaskWrappers
+from source.agentic_tasks.prompt_templates import CREATION_PROMPT, QUICK_RESULT_PROMPT
+from source.dev_logger import debug
+
+assistant_instructions = "I am tom. I am salesperson that wants to sell solar roofs to customers jerry. Please provide me with information that helps me to sell solar roofs to jerry. You may also provide tips what to ask next."
+chat = "\n".join(f"jerry: line {index} of the conversation about solar roofs and their costs." for index in range(60))
+tasks_not_to_create = str([f"{index}: look up subsidies for solar roofs variant {index}" for index in range(10)])
+query_or_task = "What are typical payback times of solar roofs in germany?"
+
+
+def creation_prompt_per_call() -> str:
+	prompt = ""
+	prompt += ("you create agent tasks according to the assistance_instructions taking_into_account_the_context_and_the_chat.\n")
+	prompt += ("previously you already have created such tasks (tasks_not_to_create). you shall not create duplicates or near duplicates of those tasks.\n")
+	prompt += ("if you deem it appropriate. you now can create a new task in case you think thumbsting similar does not already exist.\n")
+	prompt += ("your output shall be put into <json> tags in the following form:\n")
+	prompt += ("<json>ResultHere</json>\n")
+	prompt += f"ResultHere shall suffice {ListOfAgenticTaskWrappers.get_pydantic_output_parser().get_format_instructions()}\n"
+	prompt += (f"<assistance_instructions>{assistant_instructions}</assistance_instructions>\n")
+	prompt += (f"<tasks_not_to_create>{tasks_not_to_create}</tasks_not_to_create>\n")
+	prompt += (f"<chat>{chat}</chat>\n")
+	return prompt
+
+
+def creation_prompt_compiled() -> str:
+	return CREATION_PROMPT.render(assistant_instructions = assistant_instructions, chat = chat, tasks_not_to_create = tasks_not_to_create)
+
+
+def quick_result_prompt_per_call() -> str:
+	parser = PydanticOutputParser(pydantic_object = AgentTaskResult)
+	prompt = "You are a concise assistant.\n"
+	prompt += "If you can answer without external lookup, do so.\n"
+	prompt += "If you think you need to look something up, answer with empty <json></json>.\n"
+	prompt += "Put your answer in <json>...</json> tags.\n"
+	prompt += "Your answer must match this schema:\n"
+	prompt += parser.get_format_instructions() + "\n\n"
+	prompt += "Context from previous chat:\n"
+	prompt += "<chat>"
+	prompt += chat
+	prompt += "</chat>\n"
+	prompt += "Context from current task:\n"
+	prompt += f"You're given the following query or task: <query_or_task>{query_or_task}</query_or_task>.\n"
+	return prompt
+
+
+def quick_result_prompt_compiled() -> str:
+	return QUICK_RESULT_PROMPT.render(chat = chat, quick_access_section = "", query_or_task = query_or_task)
+
+
+def main(number: int = 2000):
+	assert creation_prompt_per_call() == creation_prompt_compiled()
+	assert quick_result_prompt_per_call() == quick_result_prompt_compiled()
+	for name, per_call, compiled in (
+			("creation", creation_prompt_per_call, creation_prompt_compiled),
+			("quick result", quick_result_prompt_per_call, quick_result_prompt_compiled),
+	):
+		per_call_us = timeit.timeit(per_call, number = number) / number * 1e6
+		compiled_us = timeit.timeit(compiled, number = number) / number * 1e6
+		debug(f"{name} prompt: per call construction {per_call_us:.1f} us, compiled template {compiled_us:.1f} us ({per_call_us / compiled_us:.1f}x)")
+
+
+if __name__ == "__main__":
+	main()
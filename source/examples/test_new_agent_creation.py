@@ -6,8 +6,8 @@ from source.chat.message import Message
 from source.dev_logger import debug
 
 agent_pool = AgentPool()
-agent_tasks_factory = AgenticTasksFactory()
-agent_rater = AgentRater()
+agent_tasks_factory = AgenticTasksFactory(agent_pool = agent_pool)
+agent_rater = AgentRater(agent_pool = agent_pool)
 
 
 async def test_new_agent_creation( messages_json : list[dict[str, str]]):
@@ -1,8 +1,11 @@
-from source.agentic_tasks.agent_pool import AgentPool
-from source.agentic_tasks.agent_rater import AgentRater
-from source.agentic_tasks.agentic_tasks_factory import AgenticTasksFactory
+from source.agentic_tasks.agent_session import SessionRegistry
 from source.global_instances.agents_config import global_agents_config
 
-agent_pool = AgentPool(config=global_agents_config)
-agent_tasks_factory = AgenticTasksFactory(agent_pool=agent_pool, config=global_agents_config)
-agent_rater = AgentRater(agent_pool=agent_pool, config=global_agents_config)
+session_registry = SessionRegistry(base_config=global_agents_config)
+# the live meeting of the web app; further conversations get their own session from session_registry
+default_session = session_registry.get_or_create("livekit-conversation", config=global_agents_config)
+agent_pool = default_session.agent_pool
+agent_tasks_factory = default_session.agent_tasks_factory
+agent_rater = default_session.agent_rater
+agent_creator_and_rater = default_session.agent_creator_and_rater
+pool_snapshotter = default_session.pool_snapshotter
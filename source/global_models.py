@@ -1,5 +1,7 @@
 from typing import Any
 
+from langchain_core.language_models import BaseChatModel
+
 from source.dev_logger import debug, measure_time
 from source.locations_and_config import data_dir, config
 from langchain_community.cache import SQLiteCache
@@ -15,6 +17,8 @@ from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
 chat_cache: Any = SQLiteCache(database_path=data_dir/"llm_cache.db")  # persists on disk :contentReference[oaicite:0]{index=0}
 # 2️⃣ Local filesystem store (creates ./embeddings_cache/)
 emb_store = LocalFileStore(data_dir/ "embeddings_cache")
+# generated summarization instructions, shared between processes and restarts
+summarization_instructions_store = LocalFileStore(data_dir / "summarization_instructions_cache")
 
 
 gemini_flash_2_5_thinking_model = ChatGoogleGenerativeAI(
@@ -44,6 +48,9 @@ thinking_budget=0,
 	google_api_key = config.gemini_api_key,
 )
 
+def get_model_name(llm: BaseChatModel) -> str:
+	return str(getattr(llm, "model", None) or getattr(llm, "model_name", None) or llm.__class__.__name__)
+
 base_embeddings = OpenAIEmbeddings(openai_api_key=config.openai_api_key)
 default_cheapest_model = gemini_flash_2_5_no_thinking_model
 default_thinking_model = gemini_flash_2_5_thinking_model
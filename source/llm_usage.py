@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class LlmUsage:
+	"""Accumulated token usage and latency of the LLM calls of one call site."""
+	number_of_calls: int = 0
+	input_tokens: int = 0
+	cached_input_tokens: int = 0  # input tokens the provider read from its (implicit or explicit) prompt cache
+	number_of_cache_hits: int = 0
+	output_tokens: int = 0
+	seconds: float = 0.0
+
+	def record(self, result: Any, seconds: float) -> None:
+		"""
+		:param result: AIMessage (or the sum of all streamed AIMessageChunks) of the call
+		"""
+		usage = getattr(result, "usage_metadata", None) or {}
+		self.number_of_calls += 1
+		self.input_tokens += usage.get("input_tokens", 0)
+		cached_input_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+		self.cached_input_tokens += cached_input_tokens
+		self.number_of_cache_hits += cached_input_tokens > 0
+		self.output_tokens += usage.get("output_tokens", 0)
+		self.seconds += seconds
+
+	def as_dict(self) -> dict[str, float]:
+		return {
+			"calls": self.number_of_calls,
+			"input_tokens": self.input_tokens,
+			"cached_input_tokens": self.cached_input_tokens,
+			"cache_hit_rate": round(self.number_of_cache_hits / self.number_of_calls, 3) if self.number_of_calls else 0.0,
+			"cached_input_share": round(self.cached_input_tokens / self.input_tokens, 3) if self.input_tokens else 0.0,
+			"output_tokens": self.output_tokens,
+			"seconds": round(self.seconds, 3),
+			"seconds_per_call": round(self.seconds / self.number_of_calls, 3) if self.number_of_calls else 0.0,
+		}
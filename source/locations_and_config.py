@@ -20,6 +20,7 @@ path_agent_js = path_static_js_dir / "agent.js"
 path_agent_css = path_static_css_dir / "agent.css"
 
 path_persistence_dir = data_dir / "persistence"
+path_agent_pool_snapshot = path_persistence_dir / "agent_pool_snapshot.msgpack"
 
 class Config(BaseModel):
 	livekit_room_name: str = "Default Room"
@@ -0,0 +1,90 @@
+"""
+Explicit context caching of the static prompt prefixes for Gemini models.
+
+Every CompiledPrompt starts with its static_prefix (role, output contract, schema), so providers with
+implicit prefix caching reuse it on their own. With gemini_cached_content enabled, the prefix is
+additionally uploaded once as a cached content per model; the calls then only send the rest of the
+prompt together with the handle of the cache.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+from google.ai import generativelanguage_v1beta as glm
+from google.protobuf import duration_pb2
+from langchain_core.language_models import BaseChatModel
+from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+from pydantic import BaseModel, Field
+
+from source.dev_logger import debug
+from source.global_models import get_model_name
+
+
+class PromptCachingConfig(BaseModel):
+	gemini_cached_content: bool = Field(default = False, description = "Upload the static prompt prefixes as Gemini cached contents and send only the rest of the prompts.")
+	ttl_sec: int = Field(default = 3600, description = "Lifetime of a cached content; it is recreated when it is about to expire.")
+	minimum_prefix_characters: int = Field(default = 4000, description = "Shorter prefixes are not cached explicitly (Gemini needs at least 1024 tokens).")
+
+
+class GeminiCachedContents:
+	"""Names of the cached contents by (model, prefix); created on first use, failures are not retried before ttl_sec."""
+
+	def __init__(self):
+		self._entries: dict[tuple[str, str], tuple[str | None, float]] = {}  # -> (name or None after a failure, expires at)
+		self._clients: dict[str, glm.CacheServiceAsyncClient] = {}
+		self._lock: asyncio.Lock = asyncio.Lock()
+		self.number_of_created: int = 0
+
+	def _client(self, llm: ChatGoogleGenerativeAI) -> glm.CacheServiceAsyncClient:
+		api_key = llm.google_api_key.get_secret_value()
+		if api_key not in self._clients:
+			self._clients[api_key] = glm.CacheServiceAsyncClient(client_options = {"api_key": api_key})
+		return self._clients[api_key]
+
+	async def _create(self, llm: ChatGoogleGenerativeAI, model_name: str, prefix: str, ttl_sec: int) -> str:
+		model = model_name if model_name.startswith("models/") else f"models/{model_name}"
+		cached_content = await self._client(llm).create_cached_content(cached_content = glm.CachedContent(
+			model = model,
+			contents = [glm.Content(role = "user", parts = [glm.Part(text = prefix)])],
+			ttl = duration_pb2.Duration(seconds = ttl_sec),
+		))
+		self.number_of_created += 1
+		debug(f"Created Gemini cached content {cached_content.name} for a {len(prefix)} character prompt prefix of {model}.")
+		return cached_content.name
+
+	async def get_name(self, llm: BaseChatModel, prefix: str, config: PromptCachingConfig) -> str | None:
+		if not isinstance(llm, ChatGoogleGenerativeAI) or len(prefix) < config.minimum_prefix_characters:
+			return None
+		key = (get_model_name(llm), prefix)
+		# 60 sec margin, so a call does not reference a cache that expires while it is running
+		entry = self._entries.get(key)
+		if entry is not None and entry[1] - 60 > time.time():
+			return entry[0]
+		async with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and entry[1] - 60 > time.time():
+				return entry[0]
+			try:
+				name = await self._create(llm, key[0], prefix, config.ttl_sec)
+			except Exception as e:
+				debug(f"Could not create Gemini cached content for {key[0]}: {e}")
+				name = None
+			self._entries[key] = (name, time.time() + config.ttl_sec)
+			return name
+
+
+gemini_cached_contents = GeminiCachedContents()
+
+
+async def prepare_cached_prompt(llm: BaseChatModel, prompt: str, static_prefix: str, config: PromptCachingConfig) -> tuple[str, dict[str, Any]]:
+	"""
+	:return: (text to send, keyword arguments for ainvoke/astream); without a cached content that is the whole prompt
+	"""
+	if not config.gemini_cached_content or not prompt.startswith(static_prefix):
+		return prompt, {}
+	name = await gemini_cached_contents.get_name(llm, static_prefix, config)
+	if name is None:
+		return prompt, {}
+	return prompt[len(static_prefix):], {"cached_content": name}
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from source.dev_logger import debug
+
+
+class SingleFlight:
+	"""
+	Deduplicates concurrent calls of the same expensive coroutine.
+	The first caller for a key starts the work, every caller that arrives while it is
+	still running awaits the same result instead of starting the work again.
+	"""
+	
+	def __init__(self, name: str = "single_flight") -> None:
+		self.name: str = name
+		self._in_flight: dict[Hashable, asyncio.Task[Any]] = {}
+		self.number_of_calls: int = 0
+		self.number_of_executions: int = 0
+		self.number_of_duplicates_avoided: int = 0
+	
+	async def run(self, key: Hashable, coroutine_factory: Callable[[], Awaitable[Any]]) -> Any:
+		self.number_of_calls += 1
+		task = self._in_flight.get(key)
+		if task is None:
+			self.number_of_executions += 1
+			task = asyncio.ensure_future(coroutine_factory())
+			self._in_flight[key] = task
+			task.add_done_callback(lambda t: self._forget(key, t))
+		else:
+			self.number_of_duplicates_avoided += 1
+			debug(f"{self.name}: joined running call for {key}")
+		# shield: a cancelled caller must not cancel the work the other callers are waiting for
+		return await asyncio.shield(task)
+	
+	def _forget(self, key: Hashable, task: asyncio.Task[Any]) -> None:
+		if self._in_flight.get(key) is task:
+			del self._in_flight[key]
+	
+	def is_running(self, key: Hashable) -> bool:
+		return key in self._in_flight
+	
+	def statistics(self) -> dict[str, int]:
+		return {
+			"calls": self.number_of_calls,
+			"executions": self.number_of_executions,
+			"duplicates_avoided": self.number_of_duplicates_avoided,
+			"in_flight": len(self._in_flight),
+		}
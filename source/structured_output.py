@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Type
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+
+
+class OutputMode(str, Enum):
+	tagged_json = "tagged_json"  # free text answer; the JSON between <json> tags is parsed by a PydanticOutputParser
+	native = "native"  # the provider's JSON schema / structured output through with_structured_output
+
+
+@dataclass
+class _ModeCounters:
+	attempts: int = 0
+	parse_failures: int = 0
+
+
+class StructuredOutputStatistics:
+	"""
+	Per call site and OutputMode: LLM calls and how many of their answers could not be parsed.
+	What a parse failure costs depends on the call site: task creation and rating re-issue the call once
+	on default_thinking_model (and raise if that was the model already), the summary falls back to the
+	tagged prompt and DefaultAgent escalates to its agentic path or returns an error result.
+	So parse_failures / attempts is the failure rate of the mode and an upper bound of its retry rate.
+	"""
+
+	def __init__(self):
+		self.counters: dict[OutputMode, _ModeCounters] = {mode: _ModeCounters() for mode in OutputMode}
+
+	def record(self, mode: OutputMode, parsed: bool) -> None:
+		counters = self.counters[OutputMode(mode)]
+		counters.attempts += 1
+		if not parsed:
+			counters.parse_failures += 1
+
+	def retry_rate(self, mode: OutputMode) -> float:
+		counters = self.counters[OutputMode(mode)]
+		return counters.parse_failures / counters.attempts if counters.attempts else 0.0
+
+	def as_dict(self) -> dict[str, dict[str, float]]:
+		return {
+			mode.value: {
+				"attempts": counters.attempts,
+				"parse_failures": counters.parse_failures,
+				"retry_rate": round(self.retry_rate(mode), 3),
+			}
+			for mode, counters in self.counters.items()
+		}
+
+
+# with_structured_output builds a new runnable (and converts the schema) on every call, so keep one per model and schema
+_structured_llms: dict[tuple[int, Type[BaseModel]], Runnable] = {}
+
+
+def get_structured_llm(llm: BaseChatModel, schema: Type[BaseModel]) -> Runnable:
+	key = (id(llm), schema)
+	structured_llm = _structured_llms.get(key)
+	if structured_llm is None:
+		structured_llm = _structured_llms[key] = llm.with_structured_output(schema, include_raw = True)
+	return structured_llm
+
+
+async def ainvoke_structured(llm: BaseChatModel, prompt: str, schema: Type[BaseModel]) -> tuple[BaseModel | None, Any, Exception | None]:
+	"""
+	Native structured output call.
+	:return: (parsed object or None, raw AIMessage for usage accounting, parsing error or None)
+	"""
+	result = await get_structured_llm(llm, schema).ainvoke(prompt)
+	parsed, parsing_error = result.get("parsed"), result.get("parsing_error")
+	if parsed is None and parsing_error is None:
+		parsing_error = ValueError(f"No {schema.__name__} in the structured output of the model.")
+	return parsed, result.get("raw"), parsing_error
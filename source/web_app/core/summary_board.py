@@ -11,12 +11,14 @@ from pydantic import BaseModel, Field
 
 from source.agentic_tasks.agent_pool import AgentPool
 from source.agentic_tasks.agent_task_wrapper import AgentTaskResult, AgenticTaskWrapper
-
+from source.agentic_tasks.pool_events import PoolEvent, PoolEventType
 
 class SummaryBoard:
 	def __init__(self) -> None:
 		self._clients: set[WebSocket] = set()
 		self._last_results: list[dict] = []
+		self._shown_task_ids: set[str] = set()
+		self.number_of_board_updates: int = 0
 	
 	async def connect(self, ws: WebSocket) -> None:
 		await ws.accept()
@@ -27,9 +29,7 @@ class SummaryBoard:
 	def disconnect(self, ws: WebSocket) -> None:
 		self._clients.discard(ws)
 
-	async def _broadcast(self, results: list[AgentTaskResult]) -> None:
-		payload = [r.prepare_json_for_gui() for r in results]
-		self._last_results = payload
+	async def _broadcast(self, payload: list[dict]) -> None:
 		stale: set[WebSocket] = set()
 		for ws in self._clients:
 			try:
@@ -41,12 +41,40 @@ class SummaryBoard:
 
 	def inform_change(self, agent_pool: AgentPool, task: AgenticTaskWrapper = None) -> None:
 		top_active_queries = agent_pool.get_active_agent_tasks(maximum_number = 6)
-		stuff_to_add = []
-		for agent_query in top_active_queries:
-			if agent_query.result:
-				stuff_to_add.append(agent_query.result)
+		shown_tasks = [agent_query for agent_query in top_active_queries if agent_query.result]
+		self._shown_task_ids = {agent_query.task_id for agent_query in shown_tasks}
+		stuff_to_add: list[AgentTaskResult] = [agent_query.result for agent_query in shown_tasks]
 		stuff_to_add.sort(key = lambda x: ord(x.group[0]))
-		asyncio.create_task(self._broadcast(stuff_to_add))
+		payload = [r.prepare_json_for_gui() for r in stuff_to_add]
+		if payload == self._last_results:
+			return
+		self._last_results = payload
+		self.number_of_board_updates += 1
+		asyncio.create_task(self._broadcast(payload))
+	
+	def _affects_board(self, event: PoolEvent) -> bool:
+		# only tasks with a result are shown: a change matters if the task is on the board or may now get onto it
+		if event.task_id in self._shown_task_ids:
+			return True
+		return event.type in (PoolEventType.RESULT, PoolEventType.RESCORED) and event.has_result
+	
+	async def follow_pool_events(self, agent_pool: AgentPool) -> None:
+		"""
+		Update the board from the pool's change events instead of per-task callbacks; all events that
+		arrived since the last update are handled with a single recomputation of the top tasks.
+		"""
+		subscription = agent_pool.events.subscribe("summary_board")
+		try:
+			while True:
+				number_dropped = subscription.number_of_dropped
+				events = await subscription.get_batch()
+				if not events:
+					return
+				# dropped events are unknown changes, recompute to be safe
+				if subscription.number_of_dropped > number_dropped or any(self._affects_board(event) for event in events):
+					self.inform_change(agent_pool)
+		finally:
+			subscription.close()
 		
 		
 		
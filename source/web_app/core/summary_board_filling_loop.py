@@ -7,7 +7,8 @@ from typing import TypeVar, List, Callable
 from source.chat.message import Message
 from source.dev_logger import debug
 from source.global_instances.custom_assembly_ai_multi_client_factory import global_custom_assembly_ai_multi_client_factory
-from source.global_instances.agent_instances import agent_tasks_factory, agent_rater
+from source.global_instances.agent_instances import default_session
+from source.web_app.core.summary_board import summary_board
 
 T = TypeVar("T")
 
@@ -37,14 +38,15 @@ async def summary_report_filling_loop(drain_queue_before: bool = True) -> None:
 			await drain_queue(
 				global_custom_assembly_ai_multi_client_factory.messages_queue
 			)
-		agent_tasks_factory.run_in_loop_task = asyncio.create_task(
-			agent_tasks_factory.run_in_loop()
-		)
-		agent_rater.run_in_loop_task = asyncio.create_task(
-	        agent_rater.run_in_loop()
+		summary_board.run_in_loop_task = asyncio.create_task(
+			summary_board.follow_pool_events(default_session.agent_pool)
 		)
+		restored_message = await default_session.start()
+		if restored_message is not None:
+			summary_board.inform_change(agent_pool = default_session.agent_pool)
 		
-		first_message = await aget(global_custom_assembly_ai_multi_client_factory.messages_queue)
+		# a restored conversation is continued, otherwise the first received message starts it
+		first_message = restored_message or await aget(global_custom_assembly_ai_multi_client_factory.messages_queue)
 		while True:
 			new_message = await aget(global_custom_assembly_ai_multi_client_factory.messages_queue)
 			debug(f"New message received: {new_message.content_as_string}")
@@ -54,8 +56,7 @@ async def summary_report_filling_loop(drain_queue_before: bool = True) -> None:
 				timestamp_of_change = datetime.now()
 			)
 			first_message = first_message.get_most_recent_message()
-			agent_tasks_factory.set_latest_unprocessed_message(first_message)
-			agent_rater.set_latest_unprocessed_message(first_message)
+			default_session.set_latest_unprocessed_message(first_message)
 	except Exception as e:
 		traceback.print_exc()
 		raise e
@@ -21,8 +21,8 @@ from source.web_app.app import app
 from source.web_app.routers.summary_board.summary_board import summary_board_router
 
 agent_pool = AgentPool()
-agent_tasks_factory = AgenticTasksFactory()
-agent_rater = AgentRater()
+agent_tasks_factory = AgenticTasksFactory(agent_pool = agent_pool)
+agent_rater = AgentRater(agent_pool = agent_pool)
 
 async def fake_messages_input_loop(messages_json, sleep_time=1.5):
 	messages_list = Message.create_messages_list_from_list(messages_json = messages_json)
@@ -0,0 +1,44 @@
+import asyncio
+
+from source.agentic_tasks.agent_run_scheduler import AgentRunScheduler, AgentRunSchedulerConfig
+
+
+class _Task:
+	def __init__(self, query_or_task: str, relevance: float = 0.5):
+		self.query_or_task = query_or_task
+		self.relevance = relevance
+
+	def get_relevance(self) -> float:
+		return self.relevance
+
+
+def test_run_cancelled_while_queued_does_not_leak_the_slot():
+	async def scenario():
+		scheduler = AgentRunScheduler(AgentRunSchedulerConfig(maximum_concurrent_runs = 1))
+		release_a = asyncio.Event()
+		queued_runs: list[asyncio.Task] = []
+
+		async def run(task: _Task, release: asyncio.Event | None = None):
+			async with scheduler.slot(task, model_name = "model"):
+				if release is not None:
+					await release.wait()
+					# B is cancelled while queued and A releases its slot before B's coroutine unwinds
+					queued_runs[0].cancel()
+
+		run_a = asyncio.create_task(run(_Task("a"), release_a))
+		await asyncio.sleep(0)
+		run_b = asyncio.create_task(run(_Task("b")))
+		queued_runs.append(run_b)
+		await asyncio.sleep(0)
+		assert scheduler.statistics()["waiting"] == 1
+
+		release_a.set()
+		await asyncio.gather(run_a, run_b, return_exceptions = True)
+		assert run_a.exception() is None
+		assert scheduler.statistics()["running"] == 0
+		assert scheduler.statistics()["waiting"] == 0
+
+		await asyncio.wait_for(run(_Task("c")), timeout = 1)
+		assert scheduler.statistics()["admitted"] == 2
+
+	asyncio.run(scenario())
@@ -0,0 +1,18 @@
+from source.chat.extractive_compression import ExtractiveCompressor
+
+
+def test_acknowledgement_only_sentences_are_dropped_but_not_their_words_elsewhere():
+	compressor = ExtractiveCompressor(target_ratio = 1.0, minimum_number_of_words = 0)
+	lines = [
+		("A", "Yeah."),
+		("B", "Okay."),
+		("A", "Right, Friday then."),
+		("B", "Yeah okay sure."),
+		("A", "Um, uh."),
+		("B", "We still need the offer for the solar roof."),
+	]
+	compressed = compressor.compress_lines(lines)
+	assert "Right, Friday then." in compressed
+	assert "solar roof" in compressed
+	for filler in ("Yeah.", "Okay.", "Yeah okay sure.", "Um, uh."):
+		assert filler not in compressed
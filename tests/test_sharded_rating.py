@@ -0,0 +1,50 @@
+from pydantic import BaseModel
+
+from source.agentic_tasks.sharded_rating import ShardedRatingConfig, calibrate_shard, split_into_shards
+
+
+class _Task:
+	def __init__(self, task_id: str, relevance: float):
+		self.task_id = task_id
+		self.relevance = relevance
+
+	def get_relevance(self) -> float:
+		return self.relevance
+
+
+class _Rating(BaseModel):
+	task_id: str
+	relevance_to_instructions: float
+	urgency: float
+
+
+def test_every_task_is_in_a_shard_and_every_shard_holds_the_anchors():
+	tasks = [_Task(str(index), relevance = index / 20) for index in range(20)]
+	anchors, shards = split_into_shards(tasks, ShardedRatingConfig(shard_size = 6, number_of_anchors = 2))
+	assert [task.task_id for task in anchors] == ["19", "18"]
+	assert all(len(shard) <= 6 for shard in shards)
+	assert all(anchor in shard for shard in shards for anchor in anchors)
+	assert {task.task_id for shard in shards for task in shard} == {task.task_id for task in tasks}
+	# apart from the anchors, no task is rated twice
+	own_tasks = [task.task_id for shard in shards[1:] for task in shard if task not in anchors]
+	assert len(own_tasks) == len(set(own_tasks)) == 20 - len(shards[0])
+
+
+def test_calibration_shifts_by_the_anchor_difference_and_drops_the_anchors():
+	reference = {"a": (0.8, 0.6), "b": (0.4, 0.2)}
+	ratings = [
+		_Rating(task_id = "a", relevance_to_instructions = 0.6, urgency = 0.6),
+		_Rating(task_id = "b", relevance_to_instructions = 0.2, urgency = 0.2),
+		_Rating(task_id = "c", relevance_to_instructions = 0.5, urgency = 0.1),
+		_Rating(task_id = "d", relevance_to_instructions = 0.9, urgency = -1.0),
+	]
+	calibrated = {rating.task_id: rating for rating in calibrate_shard(ratings, anchor_ids = {"a", "b"}, reference = reference)}
+	assert set(calibrated) == {"c", "d"}
+	assert abs(calibrated["c"].relevance_to_instructions - 0.7) < 1e-9
+	assert abs(calibrated["c"].urgency - 0.1) < 1e-9
+	assert calibrated["d"].relevance_to_instructions == 1.0  # clipped
+
+
+def test_calibration_without_rated_anchors_keeps_the_ratings():
+	ratings = [_Rating(task_id = "c", relevance_to_instructions = 0.5, urgency = 0.1)]
+	assert calibrate_shard(ratings, anchor_ids = {"a"}, reference = {"a": (0.8, 0.6)}) == ratings